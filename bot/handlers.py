@@ -15,6 +15,7 @@ from services.market_data_service import MarketDataService
 from services.market_scheduler import MarketScheduler
 from services.ai_investment_analysis_service import AIInvestmentAnalysisService
 from services.workflow_service import WorkflowService
+from services.detailed_workflow_logger import DetailedWorkflowLogger
 from models.article import Article
 from config import Config
 from services.enhanced_financial_rss_service import EnhancedFinancialRSSService
@@ -25,7 +26,8 @@ logger = logging.getLogger(__name__)
 class BotHandlers:
     def __init__(self, news_service: NewsService, ai_service: AIService, 
                  advanced_image_service: AdvancedImageService, facebook_service: FacebookService,
-                 logging_service, market_service: MarketDataService = None, market_scheduler: MarketScheduler = None):
+                 logging_service, market_service: MarketDataService = None, market_scheduler: MarketScheduler = None,
+                 detailed_logger: DetailedWorkflowLogger = None):
         self.news_service = news_service
         self.ai_service = ai_service
         self.advanced_image_service = advanced_image_service
@@ -42,7 +44,7 @@ class BotHandlers:
         # Initialize Workflow Service for News-Facebook AI Agent
         self.workflow_service = WorkflowService(
             news_service, ai_service, advanced_image_service, 
-            facebook_service, logging_service
+            facebook_service, logging_service, detailed_logger=detailed_logger
         )
         
         # Share user_sessions between BotHandlers and WorkflowService
@@ -81,7 +81,8 @@ class NewsBot:
         # Market scheduler will be initialized later
         self.market_scheduler = None
         
-        # Premium services will be initialized later
+        # Bot handlers and premium services will be initialized later
+        self.handlers = None
         self.premium_handlers = None
         self.smart_alerts_service = None
         
@@ -157,7 +158,8 @@ class NewsBot:
             self.facebook_service,
             self.logging_service,
             market_service=self.market_service,
-            market_scheduler=self.market_scheduler
+            market_scheduler=self.market_scheduler,
+            detailed_logger=self.detailed_logger
         )
         
         # 🎯 PREMIUM FEATURES INTEGRATION
@@ -228,6 +230,11 @@ class NewsBot:
             self.market_scheduler.stop_scheduler()
             print("✅ Market scheduler stopped")
         
+        await self.ai_service.close()
+        if self.handlers:
+            await self.handlers.ai_investment_service.close()
+            await self.handlers.financial_rss_service.close()
+        
         if self.app:
             await self.app.stop()
             await self.app.shutdown()
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 @dataclass
 class Article:
@@ -10,6 +10,14 @@ class Article:
     published_date: str
     thumbnail: Optional[str] = None
     total_score: float = 0.0
+    _previews: Dict[int, str] = field(default_factory=dict, init=False, repr=False, compare=False)
     
     def __str__(self):
         return f"{self.title} - {self.source}"
+    
+    def content_preview(self, limit: int) -> str:
+        """Return content[:limit], sliced once per article and reused across prompts"""
+        preview = self._previews.get(limit)
+        if preview is None:
+            preview = self._previews[limit] = self.content[:limit]
+        return preview
@@ -1,14 +1,21 @@
 import google.generativeai as genai
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 from config import Config
 from models.article import Article
 import aiohttp
 from bs4 import BeautifulSoup
 import asyncio
+import concurrent.futures
+import hashlib
 import json
+import random
 import re
 import logging
+import threading
+import zlib
+import numpy as np
 import feedparser
+from collections import Counter, OrderedDict, defaultdict
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -20,7 +27,17 @@ class AIService:
         # API key rotation for Gemini
         self.api_keys = self.config.get_active_api_keys('gemini')
         self.current_key_index = 0
-        self.api_usage_stats = {key: {'requests': 0, 'errors': 0} for key in self.api_keys}
+        self.api_usage_stats = defaultdict(Counter)
+        
+        # Dedicated pool for blocking Gemini calls so long HTTP waits don't starve the default executor
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(64, 4 * max(len(self.api_keys), 1)),
+            thread_name_prefix="gemini"
+        )
+        
+        # Key phrases per article, keyed by url/title hash (LRU-bounded)
+        self._phrases_cache: OrderedDict = OrderedDict()
+        self._phrases_cache_size = 1024
         
         # Configure initial Gemini API key
         self._configure_current_api()
@@ -48,7 +65,7 @@ class AIService:
         attempts = 0
         while attempts < len(self.api_keys):
             current_stats = self.api_usage_stats[self.api_keys[self.current_key_index]]
-            if current_stats['errors'] < 10:  # Allow up to 10 errors per key
+            if current_stats['quota_errors'] + current_stats['other_errors'] < 10:  # Allow up to 10 errors per key
                 break
             self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
             attempts += 1
@@ -62,46 +79,93 @@ class AIService:
         logger.info(f"🔄 Rotated to API key #{self.current_key_index + 1}")
         return True
         
-    async def _make_gemini_request(self, prompt: str, retry_count: int = 0) -> str:
-        """Make Gemini API request with error handling and rotation"""
+    async def _make_gemini_request(self, prompt: str) -> str:
+        """Make Gemini API request with error handling, rotation and jittered backoff"""
         if not self.api_keys:
             return "❌ Không có API key Gemini nào khả dụng"
-            
-        current_key = self.api_keys[self.current_key_index]
         
-        try:
-            # Track usage
-            self.api_usage_stats[current_key]['requests'] += 1
-            
-            # Make request
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
-            
-            logger.info(f"✅ Gemini request successful (Key #{self.current_key_index + 1})")
-            return response.text
-            
-        except Exception as e:
-            error_str = str(e)
-            self.api_usage_stats[current_key]['errors'] += 1
-            
-            logger.error(f"❌ Gemini API error (Key #{self.current_key_index + 1}): {error_str}")
+        max_attempts = max(3, len(self.api_keys))
+        error_str = ""
+        
+        for attempt in range(max_attempts):
+            current_key = self.api_keys[self.current_key_index]
+            stats = self.api_usage_stats[current_key]
+            stats['attempts'] += 1
             
-            # Check if it's a quota/rate limit error
-            if any(keyword in error_str.lower() for keyword in ['quota', 'rate limit', '429', 'exceeded']):
-                logger.warning(f"📊 Quota exceeded for key #{self.current_key_index + 1}, trying to rotate...")
+            try:
+                text = await self._collect_gemini_stream(prompt)
+                stats['success'] += 1
                 
-                # Try to rotate to next key
-                if retry_count < len(self.api_keys) - 1 and self._rotate_api_key():
-                    return await self._make_gemini_request(prompt, retry_count + 1)
-                else:
-                    return f"❌ Tất cả API keys Gemini đã hết quota. Lỗi: {error_str[:100]}..."
+                logger.info(f"✅ Gemini request successful (Key #{self.current_key_index + 1})")
+                return text
+                
+            except Exception as e:
+                error_str = str(e)
+                
+                logger.error(f"❌ Gemini API error (Key #{self.current_key_index + 1}, attempt {attempt + 1}/{max_attempts}): {error_str}")
+                
+                # Check if it's a quota/rate limit error
+                if any(keyword in error_str.lower() for keyword in ['quota', 'rate limit', '429', 'exceeded']):
+                    stats['quota_errors'] += 1
+                    logger.warning(f"📊 Quota exceeded for key #{self.current_key_index + 1}, trying to rotate...")
                     
-            elif retry_count == 0:
-                # For other errors, try once more with current key
-                await asyncio.sleep(2)  # Brief delay
-                return await self._make_gemini_request(prompt, retry_count + 1)
-            else:
-                return f"❌ Lỗi Gemini API: {error_str[:100]}..."
+                    # Try to rotate to next key
+                    if attempt < len(self.api_keys) - 1 and self._rotate_api_key():
+                        stats['retries'] += 1
+                        continue
+                    return f"❌ Tất cả API keys Gemini đã hết quota. Lỗi: {error_str[:100]}..."
                 
+                # For other errors, back off exponentially with jitter before retrying
+                stats['other_errors'] += 1
+                if attempt < max_attempts - 1:
+                    stats['retries'] += 1
+                    await asyncio.sleep(min(2 ** attempt + random.random(), 30))
+        
+        return f"❌ Lỗi Gemini API: {error_str[:100]}..."
+                
+    async def _make_gemini_request_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream Gemini response text chunk by chunk as it is generated"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+        model = self.model
+        
+        def _produce():
+            try:
+                for chunk in model.generate_content(prompt, stream=True):
+                    if cancelled.is_set():
+                        break
+                    text = chunk.text
+                    if text:
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+        
+        producer = loop.run_in_executor(self._executor, _produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            await producer
+        finally:
+            # Lets the worker stop early when the consumer abandons the stream
+            cancelled.set()
+    
+    async def _collect_gemini_stream(self, prompt: str) -> str:
+        """Drain a streamed Gemini response into a single string"""
+        return ''.join([chunk async for chunk in self._make_gemini_request_stream(prompt)])
+    
+    async def close(self):
+        """Shut down the Gemini worker pool"""
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+        
     def get_api_status(self) -> dict:
         """Get current API usage statistics"""
         status = {
@@ -112,10 +176,14 @@ class AIService:
         
         for i, key in enumerate(self.api_keys):
             stats = self.api_usage_stats[key]
+            errors = stats['quota_errors'] + stats['other_errors']
             status['key_stats'][f'Key #{i+1}'] = {
-                'requests': stats['requests'],
-                'errors': stats['errors'],
-                'error_rate': f"{(stats['errors'] / max(stats['requests'], 1) * 100):.1f}%",
+                'requests': stats['attempts'],
+                'success': stats['success'],
+                'errors': errors,
+                'quota_errors': stats['quota_errors'],
+                'retries': stats['retries'],
+                'error_rate': f"{(errors / max(stats['attempts'], 1) * 100):.1f}%",
                 'is_current': i == self.current_key_index
             }
             
@@ -142,7 +210,7 @@ class AIService:
         Tóm tắt bài báo sau đây bằng tiếng Việt, nêu bật tính liên quan và sức hấp dẫn:
         
         Tiêu đề: {article.title}
-        Nội dung: {article.content[:1500]}...
+        Nội dung: {article.content_preview(1500)}...
         Nguồn: {article.source}
         
         Tập trung vào:
@@ -158,6 +226,10 @@ class AIService:
     
     async def generate_facebook_post(self, article: Article, expert_posts: List[Dict] = None) -> str:
         """Generate Facebook post content in Vietnamese using Gemini"""
+        return await self._make_gemini_request(self._build_facebook_post_prompt(article, expert_posts))
+    
+    def _build_facebook_post_prompt(self, article: Article, expert_posts: List[Dict] = None) -> str:
+        """Build the Gemini prompt for a Facebook post"""
         expert_context = ""
         if expert_posts:
             expert_context = f"""
@@ -170,7 +242,7 @@ class AIService:
         Tạo một bài viết Facebook bằng tiếng Việt (250-400 từ) dựa trên bài báo này:
         
         Tiêu đề: {article.title}
-        Nội dung: {article.content[:2000]}
+        Nội dung: {article.content_preview(2000)}
         URL: {article.url}
         Nguồn: {article.source}
         {expert_context}
@@ -188,7 +260,7 @@ class AIService:
         Giọng điệu: Tự tin, có chiều sâu, đôi khi có chút châm biếm thông minh
         """
         
-        return await self._make_gemini_request(prompt)
+        return prompt
     
     async def generate_custom_content(self, prompt: str) -> str:
         """Generate content using custom prompt"""
@@ -200,6 +272,11 @@ class AIService:
     
     async def generate_expert_facebook_post(self, article: Article, verified_sources: List[Dict] = None, expert_context: Dict = None, facebook_context: Dict = None) -> str:
         """Generate Facebook post content with verified international sources and Facebook expert context"""
+        prompt = self._build_expert_facebook_post_prompt(article, verified_sources, expert_context, facebook_context)
+        return await self._make_gemini_request(prompt)
+    
+    def _build_expert_facebook_post_prompt(self, article: Article, verified_sources: List[Dict] = None, expert_context: Dict = None, facebook_context: Dict = None) -> str:
+        """Build the Gemini prompt for an expert Facebook post"""
         sources_info = ""
         if verified_sources:
             sources_info = f"""
@@ -241,7 +318,7 @@ class AIService:
         
         📰 BÀI BÁO GỐC:
         Tiêu đề: {article.title}
-        Nội dung chính: {article.content[:1500]}
+        Nội dung chính: {article.content_preview(1500)}
         URL gốc: {article.url}
         Nguồn gốc: {article.source}
         
@@ -276,7 +353,7 @@ class AIService:
         - Phải đếm từ chính xác và dừng ở 400 từ tối đa!
         """
         
-        return await self._make_gemini_request(prompt)
+        return prompt
     
     async def scrape_expert_posts(self, article: Article) -> List[Dict]:
         """Search for related articles from international sources ONLY"""
@@ -299,8 +376,8 @@ class AIService:
             # Extract key phrases from the article
             key_phrases = await self._extract_key_phrases(article)
             
-            # Get Facebook posts for CONTEXT only
-            analyst_posts = await self._search_analyst_blog(key_phrases)
+            # Get Facebook posts for CONTEXT only, dropping near-duplicates
+            analyst_posts = self._dedupe_similar_posts(await self._search_analyst_blog(key_phrases))
             
             # Create expert context
             expert_context = {
@@ -327,6 +404,34 @@ class AIService:
         
         return " | ".join(insights) if insights else ""
 
+    @staticmethod
+    def _embed_texts(texts: List[str], dim: int = 512) -> np.ndarray:
+        """Embed texts as L2-normalized hashed bag-of-words vectors, shape [N, dim]"""
+        embeddings = np.zeros((len(texts), dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets = [zlib.crc32(token.encode()) % dim for token in re.findall(r'\w+', text.lower())]
+            if buckets:
+                embeddings[i] = np.bincount(buckets, minlength=dim)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def _dedupe_similar_posts(self, posts: List[Dict], threshold: float = 0.9) -> List[Dict]:
+        """Drop posts whose description is near-identical (cosine > threshold) to an earlier kept post"""
+        if len(posts) < 2:
+            return posts
+        
+        embeddings = self._embed_texts([post.get('description', '') for post in posts])
+        similarities = embeddings @ embeddings.T
+        
+        # Keep posts in relevance order, skipping ones too close to anything already kept
+        order = sorted(range(len(posts)), key=lambda i: posts[i].get('relevance_score', 0), reverse=True)
+        kept = []
+        for i in order:
+            if not kept or similarities[i, kept].max() < threshold:
+                kept.append(i)
+        
+        return [posts[i] for i in sorted(kept)]
+
     async def _generate_expert_perspective(self, article: Article, key_phrases: List[str]) -> str:
         """Generate expert perspective based on professional financial analysis style"""
         try:
@@ -352,12 +457,18 @@ class AIService:
             return ""
     
     async def _extract_key_phrases(self, article: Article) -> List[str]:
-        """Extract key phrases from article using Gemini"""
+        """Extract key phrases from article using Gemini (cached per article)"""
+        cache_key = hashlib.sha1(f"{article.url}|{article.title}".encode()).hexdigest()
+        cached = self._phrases_cache.get(cache_key)
+        if cached is not None:
+            self._phrases_cache.move_to_end(cache_key)
+            return list(cached)
+        
         prompt = f"""
         Trích xuất 5-7 cụm từ khóa quan trọng nhất từ bài báo này để tìm kiếm các bài viết liên quan:
         
         Tiêu đề: {article.title}
-        Nội dung: {article.content[:1000]}...
+        Nội dung: {article.content_preview(1000)}...
         
         Trả về dưới dạng danh sách JSON, ví dụ: ["cụm từ 1", "cụm từ 2", ...]
         Tập trung vào các từ khóa tiếng Anh và tiếng Việt phổ biến.
@@ -370,6 +481,10 @@ class AIService:
             # Remove markdown formatting if present
             key_phrases_text = re.sub(r'```json\s*|\s*```', '', key_phrases_text)
             key_phrases = json.loads(key_phrases_text)
+            
+            self._phrases_cache[cache_key] = list(key_phrases)
+            if len(self._phrases_cache) > self._phrases_cache_size:
+                self._phrases_cache.popitem(last=False)
             return key_phrases
         except Exception as e:
             # Fallback to simple keyword extraction
@@ -715,16 +830,16 @@ class AIService:
             if word_count > 400:
                 truncated_content = ' '.join(words[:380])  # Leave space for sources
                 post_content = truncated_content + "..."
+                word_count = 380
             
             # Add source links if not present and sources available
-            if verified_sources and not any('http' in post_content for source in verified_sources):
+            if verified_sources and 'http' not in post_content:
                 sources_section = "\n\n📚 **Nguồn tham khảo:**\n"
                 for i, source in enumerate(verified_sources[:3], 1):
                     sources_section += f"{i}. {source['source']}: {source['url']}\n"
                 
-                # Check if adding sources would exceed limit
-                total_words = len((post_content + sources_section).split())
-                if total_words <= 400:
+                # Check if adding sources would exceed limit (sources section starts on a new line)
+                if word_count + len(sources_section.split()) <= 400:
                     post_content += sources_section
                 else:
                     # Add compact sources
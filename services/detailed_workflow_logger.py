@@ -1,125 +1,337 @@
 # 📊 DETAILED WORKFLOW CSV LOGGER
 # Real-time logging for complete News-Facebook AI workflow
+# Events are appended to a JSONL log, which is the source of truth; the CSV report is exported
+# from it on demand. Rows from the legacy live CSV are imported into a new, empty log once.
 
+import atexit
 import csv
 import json
 import os
+import queue
+import tempfile
 import threading
-from datetime import datetime
+import time
+from contextlib import contextmanager
 from typing import Dict, Any, Optional, List
 import logging
 
 logger = logging.getLogger(__name__)
 
+# orjson encodes/decodes in C and is several times faster on Vietnamese text; stdlib json is the fallback
+try:
+    import orjson
+    
+    def _encode_line(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    
+    def _encode_json(obj: Any) -> str:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    _decode_json = orjson.loads
+except ImportError:
+    def _encode_line(obj: Any) -> bytes:
+        return (json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+    
+    def _encode_json(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, default=str)
+    
+    _decode_json = json.loads
+
+HEADERS = (
+    'timestamp',
+    'session_id',
+    'user_id',
+    'step_category',
+    'step_action',
+    'source',
+    'articles_count',
+    'article_summaries',
+    'relevance_scores',
+    'appeal_scores',
+    'user_selection_rank',
+    'ai_call_timestamp',
+    'ai_retries',
+    'caption_text',
+    'approval_action',
+    'content_changes',
+    'image_api_timestamp',
+    'image_retries',
+    'image_url_or_id',
+    'image_approval_action',
+    'new_image_prompt',
+    'facebook_post_id',
+    'publish_timestamp',
+    'api_response_status',
+    'error_message',
+    'retry_count',
+    'duration_ms',
+    'metadata'
+)
+
+# (epoch second, formatted '%Y-%m-%dT%H:%M:%S') of the last timestamp, reused within the same second
+_iso_second_cache = (None, '')
+
+def _now_iso() -> str:
+    """Local time as an ISO-8601 string with microseconds (same format as datetime.now().isoformat())"""
+    global _iso_second_cache
+    now = time.time()
+    second = int(now)
+    cached_second, prefix = _iso_second_cache
+    if second != cached_second:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second))
+        _iso_second_cache = (second, prefix)
+    return f'{prefix}.{int((now - second) * 1e6):06d}'
+
+# Sentinel for timestamp columns that should reuse the event's own timestamp
+_NOW = object()
+TIMESTAMP_COLUMNS = ('ai_call_timestamp', 'image_api_timestamp', 'publish_timestamp')
+
+# Which timestamp column records when a log_step() block started, per step category
+STEP_START_TIMESTAMP_COLUMNS = {
+    'caption_draft': 'ai_call_timestamp',
+    'image_generation': 'image_api_timestamp',
+    'publishing': 'publish_timestamp'
+}
+
+# Columns after the first five are only stored in the log when set
+OPTIONAL_COLUMNS = HEADERS[5:]
+
+# Columns holding lists/dicts, stored natively in the log and JSON-encoded on CSV export
+JSON_COLUMNS = frozenset({'article_summaries', 'relevance_scores', 'appeal_scores', 'metadata'})
+
+# (column, is_json) pairs precomputed for the per-event and per-export loops
+_OPTIONAL_COLUMN_SPECS = tuple((column, column in JSON_COLUMNS) for column in OPTIONAL_COLUMNS)
+_CSV_COLUMN_SPECS = tuple((column, column in JSON_COLUMNS) for column in HEADERS)
+
+def _decode_rows(lines):
+    """Decode JSONL lines, skipping blanks and lines torn by a failed (short) append"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield _decode_json(line)
+        except ValueError:
+            logger.warning("⚠️ Skipping malformed detailed log line")
+
 class DetailedWorkflowLogger:
     """
     Detailed real-time CSV logger for tracking complete workflow process
     Records each step with comprehensive data as requested
+    
+    Events are queued by the caller and appended in batches by a background writer thread
+    to a newline-delimited JSON log; export_csv() derives the CSV report from it.
+    csv_file_path is the CSV the logger used to write live: it is only read, to seed an empty
+    JSONL log, and exports go to a separate *_export.csv so it is never overwritten
     """
     
-    def __init__(self, csv_file_path: str = "data/detailed_workflow_log.csv"):
+    BATCH_SIZE = 64
+    BATCH_WAIT_SECONDS = 0.05
+    
+    # Upper bounds on free-text fields so a single event can't produce a huge row
+    SUMMARY_MAX_CHARS = 240
+    CAPTION_MAX_CHARS = 2000
+    
+    def __init__(self, csv_file_path: str = "data/detailed_workflow_log.csv", log_file_path: Optional[str] = None):
         self.csv_file_path = csv_file_path
-        self.lock = threading.Lock()
+        self.log_file_path = log_file_path or os.path.splitext(csv_file_path)[0] + '.jsonl'
+        self.index_file_path = os.path.splitext(self.log_file_path)[0] + '_session_index.jsonl'
+        self.export_file_path = os.path.splitext(csv_file_path)[0] + '_export.csv'
         self.session_id = None
-        self._ensure_csv_file()
+        self._fallback_session_ids: Dict[int, str] = {}
+        if self._ensure_log_file():
+            self._import_legacy_csv()
         
-    def _ensure_csv_file(self):
-        """Ensure CSV file exists with comprehensive headers"""
-        if not os.path.exists(self.csv_file_path):
-            os.makedirs(os.path.dirname(self.csv_file_path), exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name="detailed-workflow-logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        
+    def _ensure_log_file(self) -> bool:
+        """Ensure the JSONL event log exists and open the long-lived O_APPEND descriptor.
+        
+        Returns True only for the process that created the log.
+        """
+        os.makedirs(os.path.dirname(self.log_file_path) or '.', exist_ok=True)
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        try:
+            # O_EXCL makes creation atomic: when several processes start together exactly
+            # one of them creates the log, so the legacy import below runs at most once
+            self._log_fd = os.open(self.log_file_path, flags | os.O_EXCL, 0o644)
+            return True
+        except FileExistsError:
+            self._log_fd = os.open(self.log_file_path, flags, 0o644)
+            return False
+    
+    def _import_legacy_csv(self):
+        """Seed a newly created JSONL log with the rows of the legacy live CSV, if there is one"""
+        try:
+            csvfile = open(self.csv_file_path, 'r', newline='', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        
+        rows = []
+        with csvfile:
+            for record in csv.DictReader(csvfile):
+                row = {column: record.get(column) or '' for column in HEADERS[:5]}
+                for column, is_json in _OPTIONAL_COLUMN_SPECS:
+                    value = record.get(column)
+                    if not value:
+                        continue
+                    if is_json:
+                        try:
+                            value = _decode_json(value)
+                        except ValueError:
+                            pass
+                    row[column] = value
+                rows.append(row)
+        
+        # Runs before the writer thread starts, so writing directly is safe
+        for i in range(0, len(rows), self.BATCH_SIZE):
+            self._write_rows(rows[i:i + self.BATCH_SIZE])
+        if rows:
+            logger.info(f"📊 Imported {len(rows)} legacy CSV rows into {self.log_file_path}")
+    
+    def _drain(self):
+        """Background writer: collect queued rows and append them in batches"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.BATCH_WAIT_SECONDS
             
-            headers = [
-                'timestamp',
-                'session_id',
-                'user_id',
-                'step_category',
-                'step_action',
-                'source',
-                'articles_count',
-                'article_summaries',
-                'relevance_scores',
-                'appeal_scores',
-                'user_selection_rank',
-                'ai_call_timestamp',
-                'ai_retries',
-                'caption_text',
-                'approval_action',
-                'content_changes',
-                'image_api_timestamp',
-                'image_retries',
-                'image_url_or_id',
-                'image_approval_action',
-                'new_image_prompt',
-                'facebook_post_id',
-                'publish_timestamp',
-                'api_response_status',
-                'error_message',
-                'retry_count',
-                'duration_ms',
-                'metadata'
-            ]
+            while len(batch) < self.BATCH_SIZE and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
             
-            with open(self.csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(headers)
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            if rows:
+                self._write_rows(rows)
+            
+            # Flush markers are released once everything queued before them is on disk
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+    
+    def _write_rows(self, rows: List[Dict]):
+        """Append a batch of rows to the JSONL log and index any session boundaries"""
+        try:
+            # Only the writer thread touches the descriptor, so no lock is needed here.
+            # One O_APPEND write places the whole batch at end-of-file in a single step; a short
+            # write (disk full, signal) is an error rather than finished with a second write,
+            # which another appender could land in between.
+            data = b''.join([_encode_line(row) for row in rows])
+            written = os.write(self._log_fd, data)
+            if written != len(data):
+                raise OSError(f"short write to {self.log_file_path}: {written} of {len(data)} bytes")
+            end_offset = os.lseek(self._log_fd, 0, os.SEEK_CUR)
+            start_offset = end_offset - len(data)
+            
+            # Offsets are batch-granular: the session lies somewhere inside [start_offset, end_offset]
+            index_entries = []
+            for row in rows:
+                if row['step_action'] == 'session_started':
+                    index_entries.append({'session_id': row['session_id'], 'user_id': row['user_id'], 'start_offset': start_offset})
+                elif row['step_action'] == 'session_completed':
+                    index_entries.append({'session_id': row['session_id'], 'end_offset': end_offset})
+            
+            if index_entries:
+                with open(self.index_file_path, 'a', encoding='utf-8') as indexfile:
+                    indexfile.write(''.join(_encode_json(entry) + '\n' for entry in index_entries))
+        except Exception as e:
+            logger.error(f"❌ Error writing detailed log batch: {e}")
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every event queued so far has been written"""
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+    
+    def close(self):
+        """Flush pending events and close the log descriptor"""
+        if self._log_fd is None:
+            return
+        self.flush()
+        os.close(self._log_fd)
+        self._log_fd = None
     
     def start_new_session(self, user_id: int) -> str:
         """Start a new workflow session"""
-        self.session_id = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        session_id = f"{user_id}_{time.strftime('%Y%m%d_%H%M%S')}"
+        # A single attribute store is atomic, so no lock is needed for the swap
+        self.session_id = session_id
         self._log_event(
             user_id=user_id,
             step_category='workflow_start',
             step_action='session_started'
         )
-        return self.session_id
+        return session_id
+    
+    def _fallback_session_id(self, user_id: int) -> str:
+        """Session id used before any session is started, built once per user"""
+        session_id = self._fallback_session_ids.get(user_id)
+        if session_id is None:
+            session_id = self._fallback_session_ids.setdefault(user_id, f"{user_id}_no_session")
+        return session_id
     
     def _log_event(self, user_id: int, step_category: str, step_action: str, **kwargs):
-        """Internal method to log events to CSV"""
-        with self.lock:
-            try:
-                timestamp = datetime.now().isoformat()
-                
-                # Default values for all fields
-                row_data = {
-                    'timestamp': timestamp,
-                    'session_id': self.session_id or f"{user_id}_no_session",
-                    'user_id': user_id,
-                    'step_category': step_category,
-                    'step_action': step_action,
-                    'source': kwargs.get('source', ''),
-                    'articles_count': kwargs.get('articles_count', ''),
-                    'article_summaries': json.dumps(kwargs.get('article_summaries', []), ensure_ascii=False) if kwargs.get('article_summaries') else '',
-                    'relevance_scores': json.dumps(kwargs.get('relevance_scores', []), ensure_ascii=False) if kwargs.get('relevance_scores') else '',
-                    'appeal_scores': json.dumps(kwargs.get('appeal_scores', []), ensure_ascii=False) if kwargs.get('appeal_scores') else '',
-                    'user_selection_rank': kwargs.get('user_selection_rank', ''),
-                    'ai_call_timestamp': kwargs.get('ai_call_timestamp', ''),
-                    'ai_retries': kwargs.get('ai_retries', ''),
-                    'caption_text': kwargs.get('caption_text', ''),
-                    'approval_action': kwargs.get('approval_action', ''),
-                    'content_changes': kwargs.get('content_changes', ''),
-                    'image_api_timestamp': kwargs.get('image_api_timestamp', ''),
-                    'image_retries': kwargs.get('image_retries', ''),
-                    'image_url_or_id': kwargs.get('image_url_or_id', ''),
-                    'image_approval_action': kwargs.get('image_approval_action', ''),
-                    'new_image_prompt': kwargs.get('new_image_prompt', ''),
-                    'facebook_post_id': kwargs.get('facebook_post_id', ''),
-                    'publish_timestamp': kwargs.get('publish_timestamp', ''),
-                    'api_response_status': kwargs.get('api_response_status', ''),
-                    'error_message': kwargs.get('error_message', ''),
-                    'retry_count': kwargs.get('retry_count', ''),
-                    'duration_ms': kwargs.get('duration_ms', ''),
-                    'metadata': json.dumps(kwargs.get('metadata', {}), ensure_ascii=False) if kwargs.get('metadata') else ''
-                }
+        """Internal method to queue an event for the background CSV writer"""
+        try:
+            timestamp = _now_iso()
+            for column in TIMESTAMP_COLUMNS:
+                if kwargs.get(column) is _NOW:
+                    kwargs[column] = timestamp
+            
+            row_data = {
+                'timestamp': timestamp,
+                'session_id': self.session_id or self._fallback_session_id(user_id),
+                'user_id': user_id,
+                'step_category': step_category,
+                'step_action': step_action
+            }
+            
+            # Only store optional fields that carry a value; export_csv fills the rest with ''
+            get = kwargs.get
+            for column, is_json in _OPTIONAL_COLUMN_SPECS:
+                value = get(column)
+                if value is None or value == '' or (is_json and not value):
+                    continue
+                row_data[column] = value
+            
+            self._queue.put(row_data)
+            
+            logger.info(f"📊 Detailed log: {step_category}.{step_action} - User {user_id}")
                 
-                # Write to CSV
-                with open(self.csv_file_path, 'a', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=row_data.keys())
-                    writer.writerow(row_data)
-                    
-                logger.info(f"📊 Detailed log: {step_category}.{step_action} - User {user_id}")
-                    
-            except Exception as e:
-                logger.error(f"❌ Error in detailed logging: {e}")
+        except Exception as e:
+            logger.error(f"❌ Error in detailed logging: {e}")
+    
+    @contextmanager
+    def log_step(self, user_id: int, step_category: str, step_action: str = 'step_completed', **fields):
+        """
+        Log a timed step as one row instead of a start/complete pair
+        
+        The yielded dict collects result fields; one row with duration_ms is written on exit:
+        
+            with detailed_logger.log_step(user_id, 'caption_draft', metadata={'ai_provider': 'gemini'}) as step:
+                step['caption_text'] = await ai_service.generate_content(prompt)
+        """
+        step = dict(fields)
+        start_column = STEP_START_TIMESTAMP_COLUMNS.get(step_category)
+        if start_column:
+            step.setdefault(start_column, _now_iso())
+        started = time.monotonic()
+        
+        try:
+            yield step
+        except Exception as e:
+            step.setdefault('error_message', str(e))
+            step.setdefault('api_response_status', 'error')
+            raise
+        finally:
+            step['duration_ms'] = int((time.monotonic() - started) * 1000)
+            self._log_event(user_id=user_id, step_category=step_category, step_action=step_action, **step)
     
     # =================================
     # 1. NEWS FETCH LOGGING
@@ -144,7 +356,7 @@ class DetailedWorkflowLogger:
         
         if articles_data:
             for article in articles_data:
-                summaries.append(article.get('summary', article.get('title', '')))
+                summaries.append((article.get('summary') or article.get('title') or '')[:self.SUMMARY_MAX_CHARS])
                 relevance_scores.append(article.get('relevance_score', 0))
                 appeal_scores.append(article.get('appeal_score', 0))
         
@@ -168,7 +380,8 @@ class DetailedWorkflowLogger:
                                  final_count: int, ranked_articles: List[Dict],
                                  duration_ms: int):
         """Log deduplication and ranking process"""
-        summaries = [article.get('summary', article.get('title', '')) for article in ranked_articles]
+        summaries = [(article.get('summary') or article.get('title') or '')[:self.SUMMARY_MAX_CHARS]
+                     for article in ranked_articles]
         relevance_scores = [article.get('relevance_score', 0) for article in ranked_articles]
         appeal_scores = [article.get('appeal_score', 0) for article in ranked_articles]
         
@@ -208,12 +421,12 @@ class DetailedWorkflowLogger:
     # =================================
     
     def log_caption_draft_start(self, user_id: int, ai_provider: str):
-        """Log start of AI caption generation"""
+        """Log start of AI caption generation (prefer log_step() for a single timed row)"""
         self._log_event(
             user_id=user_id,
             step_category='caption_draft',
             step_action='ai_call_started',
-            ai_call_timestamp=datetime.now().isoformat(),
+            ai_call_timestamp=_NOW,
             ai_retries=0,
             metadata={'ai_provider': ai_provider}
         )
@@ -237,7 +450,7 @@ class DetailedWorkflowLogger:
             step_category='caption_draft',
             step_action='ai_generation_completed',
             ai_retries=total_retries,
-            caption_text=final_caption,
+            caption_text=final_caption[:self.CAPTION_MAX_CHARS] if final_caption else final_caption,
             duration_ms=duration_ms
         )
     
@@ -262,12 +475,12 @@ class DetailedWorkflowLogger:
     # =================================
     
     def log_image_generation_start(self, user_id: int, image_provider: str, prompt: str):
-        """Log start of image generation"""
+        """Log start of image generation (prefer log_step() for a single timed row)"""
         self._log_event(
             user_id=user_id,
             step_category='image_generation',
             step_action='api_call_started',
-            image_api_timestamp=datetime.now().isoformat(),
+            image_api_timestamp=_NOW,
             image_retries=0,
             new_image_prompt=prompt,
             metadata={'image_provider': image_provider}
@@ -318,12 +531,12 @@ class DetailedWorkflowLogger:
     # =================================
     
     def log_facebook_publish_start(self, user_id: int):
-        """Log start of Facebook publishing"""
+        """Log start of Facebook publishing (prefer log_step() for a single timed row)"""
         self._log_event(
             user_id=user_id,
             step_category='publishing',
             step_action='publish_started',
-            publish_timestamp=datetime.now().isoformat()
+            publish_timestamp=_NOW
         )
     
     def log_facebook_publish_complete(self, user_id: int, post_id: str, 
@@ -334,7 +547,7 @@ class DetailedWorkflowLogger:
             step_category='publishing',
             step_action='publish_completed',
             facebook_post_id=post_id,
-            publish_timestamp=datetime.now().isoformat(),
+            publish_timestamp=_NOW,
             api_response_status=api_response_status,
             duration_ms=duration_ms
         )
@@ -381,30 +594,89 @@ class DetailedWorkflowLogger:
     # UTILITY METHODS
     # =================================
     
+    def _iter_log_rows(self):
+        """Stream events from the JSONL log"""
+        with open(self.log_file_path, 'rb') as logfile:
+            yield from _decode_rows(logfile)
+    
+    def _load_session_index(self) -> Dict[str, Dict]:
+        """Read the sidecar index: session_id -> {user_id, start_offset, end_offset}"""
+        index = {}
+        try:
+            indexfile = open(self.index_file_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return index
+        
+        with indexfile:
+            for line in indexfile:
+                if not line.strip():
+                    continue
+                entry = _decode_json(line)
+                if 'start_offset' in entry:
+                    index.setdefault(entry['session_id'], entry)
+                elif entry['session_id'] in index:
+                    index[entry['session_id']]['end_offset'] = entry['end_offset']
+        return index
+    
     def get_session_logs(self, session_id: str) -> List[Dict]:
         """Get all logs for a specific session"""
+        self.flush()
         try:
-            logs = []
-            with open(self.csv_file_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if row['session_id'] == session_id:
-                        logs.append(row)
-            return logs
+            entry = self._load_session_index().get(session_id)
+            if entry is None:
+                # Sessions without an index entry (e.g. '<user>_no_session') need a full scan
+                return [row for row in self._iter_log_rows() if row.get('session_id') == session_id]
+            
+            # Only read the byte range the session was written in
+            with open(self.log_file_path, 'rb') as logfile:
+                logfile.seek(entry['start_offset'])
+                end_offset = entry.get('end_offset')
+                data = logfile.read(end_offset - entry['start_offset']) if end_offset else logfile.read()
+            
+            return [row for row in _decode_rows(data.splitlines()) if row.get('session_id') == session_id]
         except Exception as e:
             logger.error(f"❌ Error reading session logs: {e}")
             return []
     
     def get_user_sessions(self, user_id: int) -> List[str]:
-        """Get all session IDs for a user"""
+        """Get all session IDs for a user (from the session index)"""
+        self.flush()
         try:
-            sessions = set()
-            with open(self.csv_file_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if str(row['user_id']) == str(user_id):
-                        sessions.add(row['session_id'])
-            return list(sessions)
+            return [session_id for session_id, entry in self._load_session_index().items()
+                    if str(entry.get('user_id')) == str(user_id)]
         except Exception as e:
             logger.error(f"❌ Error reading user sessions: {e}")
-            return [] 
\ No newline at end of file
+            return []
+    
+    def export_csv(self, out_path: Optional[str] = None) -> str:
+        """Export the JSONL log to a CSV report (defaults to export_file_path)"""
+        out_path = out_path or self.export_file_path
+        self.flush()
+        out_dir = os.path.dirname(out_path) or '.'
+        os.makedirs(out_dir, exist_ok=True)
+        
+        # mkstemp creates the file with O_CREAT | O_EXCL, so concurrent exports never share a
+        # half-written file; os.replace then swaps the finished report in atomically
+        fd, tmp_path = tempfile.mkstemp(prefix='.export-', suffix='.csv', dir=out_dir)
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(HEADERS)
+                writer.writerows(self._iter_csv_rows())
+            os.chmod(tmp_path, 0o644)  # mkstemp creates files owner-only
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        
+        return out_path
+    
+    def _iter_csv_rows(self):
+        """Stream log events as tuples in HEADERS order, JSON columns encoded"""
+        for row in self._iter_log_rows():
+            get = row.get
+            yield tuple(
+                _encode_json(value) if is_json and value else value
+                for column, is_json in _CSV_COLUMN_SPECS
+                for value in (get(column, ''),)
+            )
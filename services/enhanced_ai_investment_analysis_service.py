@@ -6,19 +6,134 @@ Dịch vụ phân tích đầu tư AI nâng cao với RSS real-time data
 
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any, Tuple, Union
+from typing import AsyncIterator, Dict, Final, List, Optional, Any, Tuple, Union
 from datetime import datetime, timedelta
-from dataclasses import dataclass
-import statistics
-import google.generativeai as genai
+from dataclasses import dataclass, field
+from collections import OrderedDict, defaultdict
+import math
+import numpy as np
+import itertools
+import aiohttp
 from config import Config
 import json
 import re
-import random
+import hashlib
+import time
+from functools import lru_cache
+from bisect import bisect_right
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+def _json_default(obj: Any) -> str:
+    """Serialize datetimes as ISO strings and anything else by str()"""
+    return obj.isoformat() if isinstance(obj, datetime) else str(obj)
+
+# orjson serializes the analysis context in one native pass; stdlib json is the fallback
+try:
+    import orjson
+    
+    def _dumps_context(obj: Any) -> str:
+        return orjson.dumps(
+            obj, default=_json_default,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode('utf-8')
+    
+    _loads_json = orjson.loads
+except ImportError:
+    def _dumps_context(obj: Any) -> str:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_json_default)
+    
+    _loads_json = json.loads
+
+# Gemini REST streaming endpoint; server-sent events, one JSON payload per "data:" line
+_GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent"
+
+# Patterns and keywords used when parsing free-form AI analyses
+_CONFIDENCE_PATTERN = re.compile(r'(\d{1,2}(?:\.\d)?)[%\s]*(?:tin cậy|confidence|điểm)', re.IGNORECASE)
+_PRICE_PATTERN = re.compile(r'(\d{1,3}(?:[,\.]\d{3})*(?:[,\.]\d{2})?)')
+_LOW_RISK_KEYWORDS = ('LOW RISK', 'RỦI RO THẤP', 'AN TOÀN')
+_HIGH_RISK_KEYWORDS = ('HIGH RISK', 'RỦI RO CAO', 'NGUY HIỂM')
+_SHORT_TERM_KEYWORDS = ('SHORT', 'NGẮN HẠN', '1-3 THÁNG')
+_LONG_TERM_KEYWORDS = ('LONG', 'DÀI HẠN', '1-3 NĂM')
+
+# Shared generator for the simulated market data
+_RNG = np.random.default_rng()
+
+# Base prices for simulated symbols
+_BASE_PRICES = {
+    'VIC': 45000, 'VCB': 95000, 'BID': 52000, 'TCB': 28000,
+    'VHM': 55000, 'HPG': 27000, 'AAPL': 175, 'GOOGL': 140,
+    'MSFT': 350, 'TSLA': 200, 'NVDA': 450
+}
+
+# Immutable defaults shared by every analysis/portfolio instead of rebuilt per call
+_DEFAULT_KEY_FACTORS: Final = (
+    "Real-time market analysis",
+    "Technical indicators alignment",
+    "Fundamental valuation metrics",
+    "Market sentiment analysis",
+    "Risk-adjusted returns"
+)
+_FALLBACK_KEY_FACTORS: Final = ("Dữ liệu không đầy đủ", "Cần cập nhật thông tin")
+_DEFAULT_RECOMMENDATIONS: Final = (
+    "Đa dạng hóa theo ngành nghề",
+    "Rebalance portfolio định kỳ",
+    "Theo dõi market conditions",
+    "Quản lý rủi ro chặt chẽ",
+    "Đầu tư dài hạn"
+)
+_FALLBACK_RECOMMENDATIONS: Final = ("Phân tích kỹ hơn khi dữ liệu đầy đủ",)
+_FALLBACK_KEY_DRIVERS: Final = ("Dữ liệu không đầy đủ",)
+
+# Simplified sector mapping for portfolio allocation; unknown symbols fall under 'Other'
+_SECTOR_MAP: Final = {
+    'VIC': 'Real Estate', 'VHM': 'Real Estate', 'VRE': 'Real Estate',
+    'VCB': 'Banking', 'BID': 'Banking', 'CTG': 'Banking', 'TCB': 'Banking',
+    'AAPL': 'Technology', 'GOOGL': 'Technology', 'MSFT': 'Technology', 'NVDA': 'Technology'
+}
+
+# Prompt length/detail instruction per analysis depth
+_DEPTH_INSTRUCTIONS: Final = {
+    'quick': "Phân tích ngắn gọn trong 150-200 từ",
+    'standard': "Phân tích chuẩn trong 300-400 từ với các yếu tố chính",
+    'deep': "Phân tích chuyên sâu trong 500-600 từ với tất cả yếu tố"
+}
+
+# Sentiment buckets indexed by (score > 30) + (score >= 70)
+_SENTIMENT_BUCKETS = ('BEARISH', 'NEUTRAL', 'BULLISH')
+
+# Financial valence lexicon (Vietnamese + English headline terms), VADER-style -4..+4 weights
+_VALENCE_LEXICON: Final = {
+    'tăng mạnh': 2.5, 'bứt phá': 2.5, 'kỷ lục': 2.0, 'tích cực': 2.0, 'khả quan': 2.0,
+    'tăng': 1.5, 'phục hồi': 1.5, 'lợi nhuận': 1.0,
+    'surge': 2.5, 'soar': 2.5, 'rally': 2.0, 'record high': 2.0, 'beat': 1.5,
+    'gain': 1.5, 'rise': 1.5, 'bull': 1.5, 'upgrade': 1.5, 'recover': 1.5,
+    'lao dốc': -2.5, 'bán tháo': -3.0, 'khủng hoảng': -3.0, 'tiêu cực': -2.0, 'lo ngại': -2.0,
+    'giảm': -1.5, 'rủi ro': -1.0, 'thua lỗ': -2.0,
+    'crash': -3.0, 'plunge': -2.5, 'sell-off': -2.5, 'recession': -2.5, 'miss': -1.5,
+    'fall': -1.5, 'decline': -1.5, 'bear': -1.5, 'downgrade': -1.5, 'loss': -1.5
+}
+# All lexicon terms in one pattern, longest first so 'tăng mạnh' is not also counted as 'tăng'
+_VALENCE_PATTERN = re.compile('|'.join(map(re.escape, sorted(_VALENCE_LEXICON, key=len, reverse=True))))
+# VADER's normalization constant: compound = total / sqrt(total^2 + alpha)
+_VALENCE_ALPHA = 15
+
+# Feed keys whose headlines stand in for each market segment; anything else counts as retail
+_INSTITUTIONAL_SOURCES: Final = frozenset({'reuters_markets', 'bloomberg_markets', 'ft_markets', 'cnbc_markets', 'marketwatch'})
+_SOCIAL_SOURCES: Final = frozenset({'coindesk', 'cointelegraph', 'yahoo_finance'})
+
+# Length of the simulated daily close history technical indicators are computed from
+_PRICE_HISTORY_DAYS = 60
+
+_MARKET_PHASES = np.array(['Bull Market', 'Bear Market', 'Correction', 'Recovery'])
+_VOLATILITY_REGIMES = np.array(['Low', 'Medium', 'High'])
+_RATE_ENVIRONMENTS = np.array(['Rising', 'Falling', 'Stable'])
+_ECONOMIC_CYCLES = np.array(['Expansion', 'Peak', 'Contraction', 'Trough'])
+_SECTOR_ROTATIONS = np.array(['Growth to Value', 'Value to Growth', 'Defensive', 'Cyclical'])
+_GLOBAL_SENTIMENTS = np.array(['Risk-On', 'Risk-Off', 'Mixed'])
+_USD_STRENGTHS = np.array(['Strong', 'Weak', 'Neutral'])
+
+@dataclass(slots=True)
 class EnhancedInvestmentAnalysis:
     symbol: str
     current_price: float
@@ -27,7 +142,7 @@ class EnhancedInvestmentAnalysis:
     target_price: float
     risk_level: str  # LOW, MEDIUM, HIGH
     analysis_summary: str
-    key_factors: List[str]
+    key_factors: Tuple[str, ...]
     technical_indicators: Dict[str, Any]
     fundamental_analysis: Dict[str, Any]
     sentiment_analysis: Dict[str, Any]
@@ -35,7 +150,7 @@ class EnhancedInvestmentAnalysis:
     time_horizon: str  # SHORT, MEDIUM, LONG
     last_updated: datetime
 
-@dataclass
+@dataclass(slots=True)
 class SmartPortfolioRecommendation:
     total_score: float
     allocation: Dict[str, float]  # symbol -> percentage
@@ -45,21 +160,181 @@ class SmartPortfolioRecommendation:
     max_drawdown: float
     diversification_score: float
     sector_allocation: Dict[str, float]
-    recommendations: List[str]
+    recommendations: Tuple[str, ...]
     rebalancing_frequency: str
 
-@dataclass
+@dataclass(slots=True)
 class MarketSentimentAnalysis:
     overall_sentiment: str  # BULLISH, BEARISH, NEUTRAL
     sentiment_score: float  # -100 to 100
     confidence: float
-    key_drivers: List[str]
+    key_drivers: Tuple[str, ...]
     news_volume: int
     social_sentiment: float
     institutional_sentiment: float
     retail_sentiment: float
     outlook: str
 
+@lru_cache(maxsize=128)
+def _symbol_pattern(symbols: frozenset) -> re.Pattern:
+    """Compile one case-insensitive alternation that finds every symbol in a single scan"""
+    alternation = '|'.join(re.escape(symbol) for symbol in sorted(symbols, key=len, reverse=True))
+    # Matching inside a lookahead tries every position, so overlapping mentions are all found
+    return re.compile(f'(?=({alternation}))', re.IGNORECASE)
+
+def _title_valence(title: str) -> float:
+    """Sum of lexicon valences for every term occurrence in a headline, in one scan"""
+    return sum(_VALENCE_LEXICON[term] for term in _VALENCE_PATTERN.findall(title.lower()))
+
+def _valence_to_score(total_valence: float) -> float:
+    """Map a summed valence onto 0-100 via VADER's compound normalization"""
+    compound = total_valence / math.sqrt(total_valence * total_valence + _VALENCE_ALPHA)
+    return 50 + 50 * compound
+
+def _wilson_confidence(mean: float, n: int, z: float = 1.96) -> float:
+    """Confidence from the width of the Wilson interval around a mean 0-100 sentiment of n scores, clipped to 50-99"""
+    if not n:
+        return 50.0
+    p = mean / 100
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return min(99.0, max(50.0, (1 - 2 * half_width) * 100))
+
+@dataclass(slots=True)
+class _SentimentTally:
+    """Running market sentiment sums, fed one batch of news at a time and combined by result()"""
+    seen: set = field(default_factory=set)
+    news_volume: int = 0
+    analysis_count: int = 0
+    score_count: int = 0
+    score_sum: float = 0.0
+    key_drivers: List[str] = field(default_factory=list)
+    segment_valence: Dict[str, float] = field(default_factory=dict)
+
+    def add_news(self, news_items: List[Dict]):
+        """Fold in a batch of market news, skipping syndicated copies of headlines already seen"""
+        for news in news_items:
+            title = news.get('title') or ''
+            digest = hashlib.blake2b(title.lower().strip().encode(), digest_size=8).digest()
+            if digest in self.seen:
+                continue
+            self.seen.add(digest)
+            self.news_volume += 1
+            
+            extracted = news.get('extracted_data', {})
+            if 'sentiment_score' in extracted:
+                self.score_count += 1
+                self.score_sum += extracted['sentiment_score']
+            if len(title) > 10 and len(self.key_drivers) < 5:
+                self.key_drivers.append(title[:80])
+            
+            # Segment sentiments from the headline lexicon, grouped by the kind of source
+            source = news.get('source')
+            segment = 'institutional' if source in _INSTITUTIONAL_SOURCES else 'social' if source in _SOCIAL_SOURCES else 'retail'
+            self.segment_valence[segment] = self.segment_valence.get(segment, 0.0) + _title_valence(title)
+
+    def add_analyses(self, market_analysis: List[Dict]):
+        """Fold in the per-segment market analyses, one sentiment score each"""
+        for analysis in market_analysis:
+            self.analysis_count += 1
+            self.score_count += 1
+            self.score_sum += analysis.get('sentiment_score', 50)
+
+    def result(self, min_news: int) -> Dict[str, Any]:
+        """The market sentiment dict for everything folded in so far"""
+        # Too little data to aggregate: answer neutral
+        if not self.analysis_count and self.news_volume < min_news:
+            return {
+                'overall_sentiment': 'NEUTRAL',
+                'sentiment_score': 50.0,
+                'confidence': 50.0,
+                'key_drivers': self.key_drivers or list(_FALLBACK_KEY_DRIVERS),
+                'news_volume': self.news_volume,
+                'social_sentiment': 50.0,
+                'institutional_sentiment': 50.0,
+                'retail_sentiment': 50.0,
+                'outlook': "Cần cập nhật dữ liệu để phân tích chính xác"
+            }
+        
+        avg_sentiment = self.score_sum / self.score_count if self.score_count else 50
+        overall_sentiment = _SENTIMENT_BUCKETS[(avg_sentiment > 30) + (avg_sentiment >= 70)]
+        segment_scores = {
+            segment: _valence_to_score(self.segment_valence[segment]) if segment in self.segment_valence else avg_sentiment
+            for segment in ('social', 'institutional', 'retail')
+        }
+        
+        return {
+            'overall_sentiment': overall_sentiment,
+            'sentiment_score': round(avg_sentiment, 1),
+            'confidence': round(_wilson_confidence(avg_sentiment, self.score_count), 1),
+            'key_drivers': list(self.key_drivers),
+            'news_volume': self.news_volume,
+            'social_sentiment': round(segment_scores['social'], 1),
+            'institutional_sentiment': round(segment_scores['institutional'], 1),
+            'retail_sentiment': round(segment_scores['retail'], 1),
+            'outlook': f"Market shows {overall_sentiment.lower()} sentiment based on {self.score_count} data points"
+        }
+
+def _ema(values: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average series, vectorized within blocks"""
+    alpha = 2 / (span + 1)
+    ema = np.array(values, dtype=np.float64)
+    if alpha >= 1 or ema.size < 2:
+        return ema
+    
+    # Inside a block the closed form divides by (1 - alpha)**k, which overflows for long series;
+    # restarting from the previous block's last value keeps (1 - alpha)**-block below e**200
+    block = max(1, int(200 / -math.log1p(-alpha)))
+    for start in range(1, ema.size, block):
+        chunk = ema[start:start + block]
+        decay = (1 - alpha) ** np.arange(1, chunk.size + 1)
+        chunk[:] = decay * (ema[start - 1] + alpha * np.cumsum(chunk / decay))
+    return ema
+
+def _simulate_price_history(current_price: float, days: int = _PRICE_HISTORY_DAYS) -> np.ndarray:
+    """Simulate a random-walk close series ending at current_price"""
+    path = np.exp(np.cumsum(_RNG.normal(0, 0.015, days)))
+    return path * (current_price / path[-1])
+
+def _compute_technical_indicators(closes: np.ndarray, volumes: np.ndarray) -> Dict[str, float]:
+    """Compute trend, momentum, volatility and volume indicators from a close series"""
+    changes = np.diff(closes)
+    
+    macd_line = _ema(closes, 12) - _ema(closes, 26)
+    macd_signal = _ema(macd_line, 9)
+    
+    recent_changes = changes[-14:]
+    gains = np.clip(recent_changes, 0, None).sum()
+    losses = np.clip(-recent_changes, 0, None).sum()
+    rsi = 100.0 if losses == 0 else 100 - 100 / (1 + gains / losses)
+    
+    windows = np.lib.stride_tricks.sliding_window_view(closes, 14)[-3:]
+    lows, highs = windows.min(axis=1), windows.max(axis=1)
+    stoch_k = (windows[:, -1] - lows) / np.maximum(highs - lows, 1e-9) * 100
+    
+    flows = changes[-14:] * volumes[-14:]
+    total_flow = np.abs(flows).sum()
+    
+    sma_20 = closes[-20:].mean()
+    std_20 = closes[-20:].std()
+    
+    return {
+        'SMA_20': sma_20,
+        'SMA_50': closes[-50:].mean(),
+        'EMA_12': _ema(closes, 12)[-1],
+        'MACD': macd_line[-1],
+        'MACD_signal': macd_signal[-1],
+        'MACD_histogram': macd_line[-1] - macd_signal[-1],
+        'RSI': rsi,
+        'STOCH_k': stoch_k[-1],
+        'STOCH_d': stoch_k.mean(),
+        'Williams_R': stoch_k[-1] - 100,
+        'ATR': np.abs(changes[-14:]).mean(),
+        'BB_upper': sma_20 + 2 * std_20,
+        'BB_lower': sma_20 - 2 * std_20,
+        'OBV': np.dot(np.sign(changes), volumes[1:]),
+        'Money_Flow': flows.sum() / total_flow * 50 if total_flow else 0.0
+    }
+
 class EnhancedAIInvestmentAnalysisService:
     """
     🚀 ENHANCED AI INVESTMENT ANALYSIS SERVICE
@@ -77,6 +352,10 @@ class EnhancedAIInvestmentAnalysisService:
     - 💡 Investment thesis generation
     """
     
+    MIN_SENTIMENT_NEWS = 3
+    MAX_CONCURRENT_AI_REQUESTS = 6
+    RATE_LIMIT_RETRIES = 4
+    
     def __init__(self, financial_rss_service=None):
         self.config = Config()
         
@@ -90,10 +369,14 @@ class EnhancedAIInvestmentAnalysisService:
         # Financial RSS Service for real-time data
         self.financial_rss_service = financial_rss_service
         
-        # Analysis cache với intelligent TTL
-        self.analysis_cache = {}
-        self.cache_ttl = {}
+        # Analysis cache với intelligent TTL: LRU of cache_key -> (cached_at, analysis)
+        self.analysis_cache: OrderedDict = OrderedDict()
+        self.analysis_cache_size = 512
         self.default_cache_duration = timedelta(minutes=15)
+        # TTL bookkeeping uses time.monotonic() seconds; datetime is only for user-facing timestamps
+        self._cache_ttl_seconds = self.default_cache_duration.total_seconds()
+        self._cache_hits = 0
+        self._cache_misses = 0
         
         # Enhanced analysis parameters
         self.analysis_params = {
@@ -133,53 +416,90 @@ class EnhancedAIInvestmentAnalysisService:
 
     def _configure_api(self):
         """Configure Gemini API with enhanced settings"""
+        self._session: Optional[aiohttp.ClientSession] = None
         if self.api_keys:
-            current_key = self.api_keys[self.current_key_index]
-            genai.configure(api_key=current_key)
-            
             # Enhanced model configuration
-            generation_config = {
+            self.generation_config = {
                 "temperature": 0.3,  # Lower for more consistent financial analysis
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 2048,
+                "topP": 0.8,
+                "topK": 40,
+                "maxOutputTokens": 2048,
             }
             
-            self.model = genai.GenerativeModel(
-                'gemini-1.5-flash',
-                generation_config=generation_config
-            )
+            # Requests rotate round-robin across keys over one pooled HTTP session
+            self._key_cycle = itertools.cycle(range(len(self.api_keys)))
+            # Caps concurrent Gemini calls so portfolio fan-out stays under the rate limit
+            self._ai_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_AI_REQUESTS)
             logger.info(f"🤖 Enhanced AI Investment Analysis Service initialized with Gemini")
         else:
             logger.error("❌ No Gemini API keys available for investment analysis")
 
-    def _make_json_serializable(self, obj: Any) -> Any:
-        """Convert datetime objects to strings for JSON serialization"""
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        elif isinstance(obj, dict):
-            return {k: self._make_json_serializable(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._make_json_serializable(item) for item in obj]
-        else:
-            return obj
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
     async def _make_enhanced_ai_request(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
         """Make enhanced AI request with context and error handling"""
         try:
             # Add context to prompt if available
             if context:
-                # Convert datetime objects to strings for JSON serialization
-                context_safe = self._make_json_serializable(context)
-                context_str = f"\n\nBỐI CẢNH BỔ SUNG:\n{json.dumps(context_safe, indent=2, ensure_ascii=False)}"
+                context_str = f"\n\nBỐI CẢNH BỔ SUNG:\n{_dumps_context(context)}"
                 prompt += context_str
             
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
-            return response.text
+            # Analyses are cached per (symbol, depth) in analysis_cache; prompts embed fresh market
+            # data, so a prompt-level cache would almost never hit
+            return ''.join([chunk async for chunk in self._stream_enhanced_ai_request(prompt)])
         except Exception as e:
             logger.error(f"❌ Enhanced AI request failed: {e}")
             return "❌ Không thể thực hiện phân tích AI. Vui lòng thử lại."
 
+    async def _stream_enhanced_ai_request(self, prompt: str) -> AsyncIterator[str]:
+        """Stream Gemini response text chunk by chunk as it is generated"""
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": self.generation_config
+        }
+        session = self._get_session()
+        
+        for attempt in range(self.RATE_LIMIT_RETRIES):
+            # The slot is taken per round, so the backoff below doesn't hold it from other requests
+            async with self._ai_semaphore:
+                # A rate-limited key hands the request to the next key in the pool
+                for _ in range(len(self.api_keys)):
+                    self.current_key_index = next(self._key_cycle)
+                    params = {"alt": "sse", "key": self.api_keys[self.current_key_index]}
+                    
+                    async with session.post(_GEMINI_STREAM_URL, params=params, json=payload) as response:
+                        if response.status == 429:
+                            logger.warning(f"⚠️ Gemini key #{self.current_key_index + 1} rate limited, rotating")
+                            continue
+                        if response.status != 200:
+                            raise RuntimeError(f"Gemini API error {response.status}: {await response.text()}")
+                        
+                        async for line in response.content:
+                            if not line.startswith(b'data:'):
+                                continue
+                            for candidate in _loads_json(line[5:]).get('candidates', [])[:1]:
+                                text = ''.join(part.get('text', '') for part in candidate.get('content', {}).get('parts', []))
+                                if text:
+                                    yield text
+                        return
+            
+            # Every key is rate limited; back off before another round
+            await asyncio.sleep(0.5 * 2 ** attempt)
+        
+        raise RuntimeError("All Gemini API keys are rate limited")
+
     async def analyze_stock_comprehensive_enhanced(self, 
                                                  symbol: str,
                                                  include_rss_data: bool = True,
@@ -197,9 +517,10 @@ class EnhancedAIInvestmentAnalysisService:
             
             # Check cache first
             cache_key = f"{symbol}_{analysis_depth}_{include_rss_data}"
-            if self._is_analysis_cached(cache_key):
+            cached_analysis = self._get_cached_analysis(cache_key)
+            if cached_analysis is not None:
                 logger.info(f"🎯 Using cached analysis for {symbol}")
-                return self.analysis_cache[cache_key]
+                return cached_analysis
             
             # Gather multi-source data
             analysis_data = await self._gather_comprehensive_data(symbol, include_rss_data)
@@ -211,8 +532,7 @@ class EnhancedAIInvestmentAnalysisService:
             structured_analysis = await self._structure_analysis_result(symbol, ai_analysis, analysis_data)
             
             # Cache the result
-            self.analysis_cache[cache_key] = structured_analysis
-            self.cache_ttl[cache_key] = datetime.now()
+            self._cache_analysis(cache_key, structured_analysis)
             
             logger.info(f"✅ Enhanced analysis completed for {symbol}")
             return structured_analysis
@@ -221,7 +541,7 @@ class EnhancedAIInvestmentAnalysisService:
             logger.error(f"❌ Enhanced stock analysis failed for {symbol}: {e}")
             return self._create_fallback_enhanced_analysis(symbol)
 
-    async def _gather_comprehensive_data(self, symbol: str, include_rss: bool) -> Dict[str, Any]:
+    async def _gather_comprehensive_data(self, symbol: str, include_rss: bool, extract_news: bool = True) -> Dict[str, Any]:
         """Gather data from multiple sources for comprehensive analysis"""
         data = {
             'symbol': symbol,
@@ -230,31 +550,54 @@ class EnhancedAIInvestmentAnalysisService:
         }
         
         try:
+            # Start the RSS fetch, then build the simulated data while it is in flight
+            use_rss = include_rss and self.financial_rss_service
+            rss_task = asyncio.ensure_future(self.financial_rss_service.get_real_time_market_summary()) if use_rss else None
+            
+            try:
+                price_data = self._get_simulated_price_data(symbol)
+            except Exception as e:
+                price_data = e
+            try:
+                market_context = self._get_market_context()
+            except Exception as e:
+                market_context = e
+            
+            try:
+                rss_data = await rss_task if rss_task else None
+            except Exception as e:
+                rss_data = e
+            
             # RSS market data and sentiment
-            if include_rss and self.financial_rss_service:
-                rss_data = await self.financial_rss_service.get_real_time_market_summary()
-                if rss_data.get('success'):
-                    data['rss_market_data'] = rss_data
-                    data['data_sources'].append('RSS')
-                    
-                    # Extract symbol-specific data
+            if isinstance(rss_data, Exception):
+                logger.error(f"❌ RSS data gathering failed: {rss_data}")
+            elif rss_data and rss_data.get('success'):
+                data['rss_market_data'] = rss_data
+                data['data_sources'].append('RSS')
+                
+                # Extract symbol-specific data
+                if extract_news:
                     symbol_news = await self._extract_symbol_specific_news(symbol, rss_data)
                     data['symbol_news'] = symbol_news
             
             # Simulated real-time price data (in production, use actual API)
-            price_data = await self._get_simulated_price_data(symbol)
-            data['price_data'] = price_data
-            data['data_sources'].append('Price_API')
-            
-            # Technical indicators simulation
-            technical_data = await self._calculate_technical_indicators(symbol, price_data)
-            data['technical_indicators'] = technical_data
-            data['data_sources'].append('Technical_Analysis')
+            if isinstance(price_data, Exception):
+                logger.error(f"❌ Price data gathering failed: {price_data}")
+            else:
+                data['price_data'] = price_data
+                data['data_sources'].append('Price_API')
+                
+                # Technical indicators simulation (depends on price data)
+                technical_data = self._calculate_technical_indicators(symbol, price_data)
+                data['technical_indicators'] = technical_data
+                data['data_sources'].append('Technical_Analysis')
             
             # Market conditions context
-            market_context = await self._get_market_context()
-            data['market_context'] = market_context
-            data['data_sources'].append('Market_Context')
+            if isinstance(market_context, Exception):
+                logger.error(f"❌ Market context gathering failed: {market_context}")
+            else:
+                data['market_context'] = market_context
+                data['data_sources'].append('Market_Context')
             
         except Exception as e:
             logger.error(f"❌ Data gathering failed: {e}")
@@ -263,155 +606,162 @@ class EnhancedAIInvestmentAnalysisService:
 
     async def _extract_symbol_specific_news(self, symbol: str, rss_data: Dict) -> List[Dict]:
         """Extract news specifically mentioning the symbol"""
-        symbol_news = []
+        return self._index_news_by_symbol([symbol], rss_data)[symbol]
+
+    def _index_news_by_symbol(self, symbols: List[str], rss_data: Dict) -> Dict[str, List[Dict]]:
+        """Map each symbol to the news items mentioning it in one scan over all news text"""
+        symbol_news = {symbol: [] for symbol in symbols}
         
         try:
             market_news = rss_data.get('financial_data', {}).get('market_news', [])
+            by_lower = {symbol.lower(): symbol for symbol in symbols}
+            pattern = _symbol_pattern(frozenset(by_lower))
+            # The longest alternative wins at each position, so a match also covers symbols that prefix it
+            covers = {key: [by_lower[other] for other in by_lower if key.startswith(other)] for key in by_lower}
             
-            for news_item in market_news:
-                title = news_item.get('title', '').lower()
-                description = news_item.get('description', '').lower()
-                
-                # Check if symbol is mentioned
-                if (symbol.lower() in title or symbol.lower() in description or
-                    any(symbol.lower() == s.lower() for s in news_item.get('extracted_data', {}).get('symbols', []))):
-                    
-                    symbol_news.append({
-                        'title': news_item.get('title'),
-                        'description': news_item.get('description'),
-                        'sentiment': news_item.get('extracted_data', {}).get('sentiment', 'neutral'),
-                        'sentiment_score': news_item.get('extracted_data', {}).get('sentiment_score', 50),
-                        'source': news_item.get('source'),
-                        'timestamp': news_item.get('timestamp')
-                    })
+            # Join the title/description column once so a single regex pass covers every item;
+            # NUL separators keep matches from spanning items
+            texts = [f"{item.get('title', '')}\n{item.get('description', '')}" for item in market_news]
+            starts = list(itertools.accumulate((len(text) + 1 for text in texts[:-1]), initial=0))
+            mentions = defaultdict(set)
+            for match in pattern.finditer('\0'.join(texts)):
+                mentions[bisect_right(starts, match.start()) - 1].update(covers[match.group(1).lower()])
+            
+            # Symbols tagged by the RSS extractor
+            for index, news_item in enumerate(market_news):
+                for tagged in news_item.get('extracted_data', {}).get('symbols', []):
+                    if tagged.lower() in by_lower:
+                        mentions[index].add(by_lower[tagged.lower()])
+            
+            for index in sorted(mentions):
+                news_item = market_news[index]
+                extracted = news_item.get('extracted_data', {})
+                entry = {
+                    'title': news_item.get('title'),
+                    'description': news_item.get('description'),
+                    'sentiment': extracted.get('sentiment', 'neutral'),
+                    'sentiment_score': extracted.get('sentiment_score', 50),
+                    'source': news_item.get('source'),
+                    'timestamp': news_item.get('timestamp')
+                }
+                for symbol in mentions[index]:
+                    symbol_news[symbol].append(entry)
             
         except Exception as e:
             logger.error(f"❌ Symbol news extraction failed: {e}")
         
-        return symbol_news[:10]  # Top 10 relevant news
+        return {symbol: news[:10] for symbol, news in symbol_news.items()}  # Top 10 relevant news
 
-    async def _get_simulated_price_data(self, symbol: str) -> Dict[str, Any]:
+    def _get_simulated_price_data(self, symbol: str) -> Dict[str, Any]:
         """Get simulated price data (replace with real API in production)"""
-        import random
-        
-        # Base prices for different symbols
-        base_prices = {
-            'VIC': 45000, 'VCB': 95000, 'BID': 52000, 'TCB': 28000,
-            'VHM': 55000, 'HPG': 27000, 'AAPL': 175, 'GOOGL': 140,
-            'MSFT': 350, 'TSLA': 200, 'NVDA': 450
-        }
-        
-        base_price = base_prices.get(symbol, 100)
+        base_price = _BASE_PRICES.get(symbol, 100)
         
         # Simulate realistic price movements
-        change_percent = random.uniform(-5, 5)
+        change_percent, high_mult, low_mult = _RNG.uniform([-5, 1.1, 0.6], [5, 1.5, 0.9]).tolist()
+        volume, shares = _RNG.integers([100000, 1000000], [5000000, 50000000]).tolist()
         current_price = base_price * (1 + change_percent / 100)
         
         return {
             'current_price': round(current_price, 2),
             'change_percent': round(change_percent, 2),
-            'volume': random.randint(100000, 5000000),
-            'high_52w': round(current_price * random.uniform(1.1, 1.5), 2),
-            'low_52w': round(current_price * random.uniform(0.6, 0.9), 2),
-            'market_cap': round(current_price * random.randint(1000000, 50000000), 2)
+            'volume': volume,
+            'high_52w': round(current_price * high_mult, 2),
+            'low_52w': round(current_price * low_mult, 2),
+            'market_cap': round(current_price * shares, 2)
         }
 
-    async def _calculate_technical_indicators(self, symbol: str, price_data: Dict) -> Dict[str, Any]:
-        """Calculate technical indicators (simulated for demo)"""
-        import random
-        
+    def _calculate_technical_indicators(self, symbol: str, price_data: Dict) -> Dict[str, Any]:
+        """Calculate technical indicators from a simulated close history (demo data)"""
         current_price = price_data.get('current_price', 100)
         
+        closes = _simulate_price_history(current_price)
+        volumes = _RNG.integers(100000, 5000000, len(closes))
+        indicators = {key: float(value) for key, value in _compute_technical_indicators(closes, volumes).items()}
+        
         return {
             'trend_indicators': {
-                'SMA_20': round(current_price * random.uniform(0.95, 1.05), 2),
-                'SMA_50': round(current_price * random.uniform(0.90, 1.10), 2),
-                'EMA_12': round(current_price * random.uniform(0.97, 1.03), 2),
+                'SMA_20': round(indicators['SMA_20'], 2),
+                'SMA_50': round(indicators['SMA_50'], 2),
+                'EMA_12': round(indicators['EMA_12'], 2),
                 'MACD': {
-                    'value': round(random.uniform(-2, 2), 3),
-                    'signal': round(random.uniform(-1.5, 1.5), 3),
-                    'histogram': round(random.uniform(-1, 1), 3)
+                    'value': round(indicators['MACD'], 3),
+                    'signal': round(indicators['MACD_signal'], 3),
+                    'histogram': round(indicators['MACD_histogram'], 3)
                 }
             },
             'momentum_indicators': {
-                'RSI': round(random.uniform(20, 80), 1),
+                'RSI': round(indicators['RSI'], 1),
                 'STOCH': {
-                    'k': round(random.uniform(20, 80), 1),
-                    'd': round(random.uniform(20, 80), 1)
+                    'k': round(indicators['STOCH_k'], 1),
+                    'd': round(indicators['STOCH_d'], 1)
                 },
-                'Williams_R': round(random.uniform(-80, -20), 1)
+                'Williams_R': round(indicators['Williams_R'], 1)
             },
             'volatility_indicators': {
-                'ATR': round(current_price * random.uniform(0.02, 0.08), 2),
+                'ATR': round(indicators['ATR'], 2),
                 'Bollinger_Bands': {
-                    'upper': round(current_price * 1.02, 2),
-                    'middle': round(current_price, 2),
-                    'lower': round(current_price * 0.98, 2)
+                    'upper': round(indicators['BB_upper'], 2),
+                    'middle': round(indicators['SMA_20'], 2),
+                    'lower': round(indicators['BB_lower'], 2)
                 }
             },
             'volume_indicators': {
-                'OBV': random.randint(1000000, 50000000),
-                'Money_Flow': round(random.uniform(-50, 50), 1)
+                'OBV': int(indicators['OBV']),
+                'Money_Flow': round(indicators['Money_Flow'], 1)
             }
         }
 
-    async def _get_market_context(self) -> Dict[str, Any]:
+    def _get_market_context(self) -> Dict[str, Any]:
         """Get current market context and conditions"""
-        import random
-        
         return {
-            'market_phase': random.choice(['Bull Market', 'Bear Market', 'Correction', 'Recovery']),
-            'volatility_regime': random.choice(['Low', 'Medium', 'High']),
-            'interest_rate_environment': random.choice(['Rising', 'Falling', 'Stable']),
-            'economic_cycle': random.choice(['Expansion', 'Peak', 'Contraction', 'Trough']),
-            'sector_rotation': random.choice(['Growth to Value', 'Value to Growth', 'Defensive', 'Cyclical']),
-            'global_sentiment': random.choice(['Risk-On', 'Risk-Off', 'Mixed']),
-            'vix_level': round(random.uniform(15, 35), 1),
-            'usd_strength': random.choice(['Strong', 'Weak', 'Neutral'])
+            'market_phase': str(_RNG.choice(_MARKET_PHASES)),
+            'volatility_regime': str(_RNG.choice(_VOLATILITY_REGIMES)),
+            'interest_rate_environment': str(_RNG.choice(_RATE_ENVIRONMENTS)),
+            'economic_cycle': str(_RNG.choice(_ECONOMIC_CYCLES)),
+            'sector_rotation': str(_RNG.choice(_SECTOR_ROTATIONS)),
+            'global_sentiment': str(_RNG.choice(_GLOBAL_SENTIMENTS)),
+            'vix_level': round(float(_RNG.uniform(15, 35)), 1),
+            'usd_strength': str(_RNG.choice(_USD_STRENGTHS))
         }
 
+    def _format_data_context(self, data: Dict) -> str:
+        """Format gathered price/technical/news/market data as prompt context blocks"""
+        symbol_news = data.get('symbol_news')
+        tech = data.get('technical_indicators')
+        ctx = data.get('market_context')
+        price = data.get('price_data')
+        
+        price_context = (
+            f"\n💰 PRICE DATA:\n• Current: {price.get('current_price')}\n• Change: {price.get('change_percent')}%\n• Volume: {price.get('volume'):,}"
+            if price is not None else ""
+        )
+        technical_context = (
+            f"\n📊 TECHNICAL INDICATORS:\n• RSI: {tech.get('momentum_indicators', {}).get('RSI', 50)}"
+            f"\n• MACD: {tech.get('trend_indicators', {}).get('MACD', {}).get('value', 0)}"
+            if tech is not None else ""
+        )
+        rss_context = (
+            "\n📰 TIN TỨC REAL-TIME:\n" + "\n".join(f"• {news['title']} (Sentiment: {news['sentiment']})" for news in symbol_news[:5])
+            if symbol_news else ""
+        )
+        market_context = (
+            f"\n🌍 MARKET CONTEXT:\n• Phase: {ctx.get('market_phase')}\n• Volatility: {ctx.get('volatility_regime')}\n• VIX: {ctx.get('vix_level')}"
+            if ctx is not None else ""
+        )
+        
+        return f"\n{price_context}\n{technical_context}\n{rss_context}\n{market_context}"
+
     async def _generate_enhanced_ai_analysis(self, symbol: str, data: Dict, depth: str) -> str:
         """Generate enhanced AI analysis with comprehensive context"""
         
-        rss_context = ""
-        if 'symbol_news' in data and data['symbol_news']:
-            news_summaries = []
-            for news in data['symbol_news'][:5]:
-                news_summaries.append(f"• {news['title']} (Sentiment: {news['sentiment']})")
-            rss_context = f"\n📰 TIN TỨC REAL-TIME:\n" + "\n".join(news_summaries)
-        
-        technical_context = ""
-        if 'technical_indicators' in data:
-            tech = data['technical_indicators']
-            rsi = tech.get('momentum_indicators', {}).get('RSI', 50)
-            macd = tech.get('trend_indicators', {}).get('MACD', {}).get('value', 0)
-            technical_context = f"\n📊 TECHNICAL INDICATORS:\n• RSI: {rsi}\n• MACD: {macd}"
-        
-        market_context = ""
-        if 'market_context' in data:
-            ctx = data['market_context']
-            market_context = f"\n🌍 MARKET CONTEXT:\n• Phase: {ctx.get('market_phase')}\n• Volatility: {ctx.get('volatility_regime')}\n• VIX: {ctx.get('vix_level')}"
-        
-        price_context = ""
-        if 'price_data' in data:
-            price = data['price_data']
-            price_context = f"\n💰 PRICE DATA:\n• Current: {price.get('current_price')}\n• Change: {price.get('change_percent')}%\n• Volume: {price.get('volume'):,}"
-        
-        depth_instruction = {
-            'quick': "Phân tích ngắn gọn trong 150-200 từ",
-            'standard': "Phân tích chuẩn trong 300-400 từ với các yếu tố chính",
-            'deep': "Phân tích chuyên sâu trong 500-600 từ với tất cả yếu tố"
-        }.get(depth, "Phân tích chuẩn")
+        depth_instruction = _DEPTH_INSTRUCTIONS.get(depth, "Phân tích chuẩn")
         
         prompt = f"""
 Bạn là chuyên gia phân tích đầu tư hàng đầu với 20 năm kinh nghiệm và access vào dữ liệu real-time.
 
 🎯 PHÂN TÍCH CỔ PHIẾU: {symbol}
-
-{price_context}
-{technical_context}
-{rss_context}
-{market_context}
+{self._format_data_context(data)}
+{self._summarize_for_model(data)}
 
 📋 YÊU CẦU PHÂN TÍCH ({depth_instruction}):
 
@@ -435,14 +785,39 @@ Bạn là chuyên gia phân tích đầu tư hàng đầu với 20 năm kinh ngh
 Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
 """
         
-        return await self._make_enhanced_ai_request(prompt, context=data)
+        # The context blocks above are the only copy of the data sent to the model
+        return await self._make_enhanced_ai_request(prompt)
+
+    def _summarize_for_model(self, data: Dict) -> str:
+        """Compact line of the data points the context blocks don't already mention"""
+        details = []
+        
+        price = data.get('price_data')
+        if price:
+            details.append(f"52W: {price.get('low_52w')} - {price.get('high_52w')}")
+        
+        tech = data.get('technical_indicators')
+        if tech:
+            trend = tech.get('trend_indicators', {})
+            bands = tech.get('volatility_indicators', {}).get('Bollinger_Bands', {})
+            details.append(f"SMA20/50: {trend.get('SMA_20')}/{trend.get('SMA_50')}")
+            details.append(f"Bollinger: {bands.get('lower')} - {bands.get('upper')}")
+        
+        ctx = data.get('market_context')
+        if ctx:
+            details.append(f"Rates: {ctx.get('interest_rate_environment')}, Cycle: {ctx.get('economic_cycle')}")
+        
+        return f"📌 KHÁC: {' | '.join(details)}" if details else ""
 
     async def _structure_analysis_result(self, symbol: str, ai_analysis: str, data: Dict) -> EnhancedInvestmentAnalysis:
         """Structure AI analysis result into enhanced dataclass"""
         
         # Parse AI response to extract structured data
         parsed_data = await self._parse_ai_analysis_enhanced(ai_analysis)
-        
+        return self._build_enhanced_analysis(symbol, parsed_data, ai_analysis, data)
+
+    def _build_enhanced_analysis(self, symbol: str, parsed_data: Dict, ai_analysis: str, data: Dict) -> EnhancedInvestmentAnalysis:
+        """Build the analysis dataclass from parsed AI fields and gathered data"""
         price_data = data.get('price_data', {})
         technical_data = data.get('technical_indicators', {})
         
@@ -454,7 +829,7 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
             target_price=parsed_data.get('target_price', price_data.get('current_price', 0)),
             risk_level=parsed_data.get('risk_level', 'MEDIUM'),
             analysis_summary=ai_analysis[:500] + "..." if len(ai_analysis) > 500 else ai_analysis,
-            key_factors=parsed_data.get('key_factors', []),
+            key_factors=parsed_data.get('key_factors', ()),
             technical_indicators=technical_data,
             fundamental_analysis=parsed_data.get('fundamental_analysis', {}),
             sentiment_analysis=self._extract_sentiment_analysis(data),
@@ -468,50 +843,46 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
         parsed = {}
         
         try:
+            upper_response = ai_response.upper()
+            
             # Extract recommendation
-            if 'BUY' in ai_response.upper():
+            if 'BUY' in upper_response:
                 parsed['recommendation'] = 'BUY'
-            elif 'SELL' in ai_response.upper():
+            elif 'SELL' in upper_response:
                 parsed['recommendation'] = 'SELL'
             else:
                 parsed['recommendation'] = 'HOLD'
             
             # Extract confidence score
-            confidence_match = re.search(r'(\d{1,2}(?:\.\d)?)[%\s]*(?:tin cậy|confidence|điểm)', ai_response, re.IGNORECASE)
+            confidence_match = _CONFIDENCE_PATTERN.search(ai_response)
             if confidence_match:
                 parsed['confidence_score'] = float(confidence_match.group(1))
             else:
                 parsed['confidence_score'] = 70.0
             
             # Extract target price
-            price_matches = re.findall(r'(\d{1,3}(?:[,\.]\d{3})*(?:[,\.]\d{2})?)', ai_response)
+            price_matches = _PRICE_PATTERN.findall(ai_response)
             if price_matches:
                 parsed['target_price'] = float(price_matches[-1].replace(',', ''))
             
             # Extract risk level
-            if any(word in ai_response.upper() for word in ['LOW RISK', 'RỦI RO THẤP', 'AN TOÀN']):
+            if any(word in upper_response for word in _LOW_RISK_KEYWORDS):
                 parsed['risk_level'] = 'LOW'
-            elif any(word in ai_response.upper() for word in ['HIGH RISK', 'RỦI RO CAO', 'NGUY HIỂM']):
+            elif any(word in upper_response for word in _HIGH_RISK_KEYWORDS):
                 parsed['risk_level'] = 'HIGH'
             else:
                 parsed['risk_level'] = 'MEDIUM'
             
             # Extract time horizon
-            if any(word in ai_response.upper() for word in ['SHORT', 'NGẮN HẠN', '1-3 THÁNG']):
+            if any(word in upper_response for word in _SHORT_TERM_KEYWORDS):
                 parsed['time_horizon'] = 'SHORT'
-            elif any(word in ai_response.upper() for word in ['LONG', 'DÀI HẠN', '1-3 NĂM']):
+            elif any(word in upper_response for word in _LONG_TERM_KEYWORDS):
                 parsed['time_horizon'] = 'LONG'
             else:
                 parsed['time_horizon'] = 'MEDIUM'
             
             # Extract key factors (simplified)
-            parsed['key_factors'] = [
-                "Real-time market analysis",
-                "Technical indicators alignment",
-                "Fundamental valuation metrics",
-                "Market sentiment analysis",
-                "Risk-adjusted returns"
-            ]
+            parsed['key_factors'] = _DEFAULT_KEY_FACTORS
             
             parsed['fundamental_analysis'] = {
                 'valuation': 'AI-analyzed',
@@ -537,18 +908,14 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
         try:
             symbol_news = data.get('symbol_news', [])
             if symbol_news:
-                sentiment_scores = [news.get('sentiment_score', 50) for news in symbol_news]
-                avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
+                sentiment_scores = np.fromiter(
+                    (news.get('sentiment_score', 50) for news in symbol_news), dtype=np.float64, count=len(symbol_news)
+                )
+                avg_sentiment = float(sentiment_scores.mean())
                 
                 sentiment_data['news_sentiment'] = round(avg_sentiment, 1)
                 sentiment_data['sentiment_score'] = round(avg_sentiment, 1)
-                
-                if avg_sentiment >= 70:
-                    sentiment_data['overall_sentiment'] = 'BULLISH'
-                elif avg_sentiment <= 30:
-                    sentiment_data['overall_sentiment'] = 'BEARISH'
-                else:
-                    sentiment_data['overall_sentiment'] = 'NEUTRAL'
+                sentiment_data['overall_sentiment'] = _SENTIMENT_BUCKETS[(avg_sentiment > 30) + (avg_sentiment >= 70)]
                 
                 sentiment_data['confidence'] = min(95, 50 + len(symbol_news) * 5)
         
@@ -557,13 +924,29 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
         
         return sentiment_data
 
-    def _is_analysis_cached(self, cache_key: str) -> bool:
-        """Check if analysis is cached and still valid"""
-        if cache_key not in self.analysis_cache:
-            return False
+    def _get_cached_analysis(self, cache_key: str) -> Optional[EnhancedInvestmentAnalysis]:
+        """Return the cached analysis if still valid, dropping it once expired"""
+        entry = self.analysis_cache.get(cache_key)
+        if entry is None:
+            self._cache_misses += 1
+            return None
+        
+        cache_time, analysis = entry
+        if (time.monotonic() - cache_time) >= self._cache_ttl_seconds:
+            del self.analysis_cache[cache_key]
+            self._cache_misses += 1
+            return None
         
-        cache_time = self.cache_ttl.get(cache_key, datetime.now() - timedelta(hours=1))
-        return (datetime.now() - cache_time) < self.default_cache_duration
+        self.analysis_cache.move_to_end(cache_key)
+        self._cache_hits += 1
+        return analysis
+
+    def _cache_analysis(self, cache_key: str, analysis: EnhancedInvestmentAnalysis):
+        """Store an analysis, evicting the least recently used entry when full"""
+        self.analysis_cache[cache_key] = (time.monotonic(), analysis)
+        self.analysis_cache.move_to_end(cache_key)
+        if len(self.analysis_cache) > self.analysis_cache_size:
+            self.analysis_cache.popitem(last=False)
 
     def _create_fallback_enhanced_analysis(self, symbol: str) -> EnhancedInvestmentAnalysis:
         """Create fallback analysis when main analysis fails"""
@@ -575,7 +958,7 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
             target_price=105.0,
             risk_level='MEDIUM',
             analysis_summary="Phân tích tự động không khả dụng. Vui lòng thử lại sau.",
-            key_factors=["Dữ liệu không đầy đủ", "Cần cập nhật thông tin"],
+            key_factors=_FALLBACK_KEY_FACTORS,
             technical_indicators={},
             fundamental_analysis={},
             sentiment_analysis={'overall_sentiment': 'NEUTRAL', 'sentiment_score': 50},
@@ -584,6 +967,99 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
             last_updated=datetime.now()
         )
 
+    async def _analyze_symbols_batch(self, symbols: List[str], analysis_depth: str = "standard") -> Dict[str, EnhancedInvestmentAnalysis]:
+        """Analyze several symbols with a single Gemini request returning one JSON object"""
+        analyses = {}
+        pending = []
+        for symbol in symbols:
+            cache_key = f"{symbol}_{analysis_depth}_True"
+            cached_analysis = self._get_cached_analysis(cache_key)
+            if cached_analysis is not None:
+                analyses[symbol] = cached_analysis
+            else:
+                pending.append(symbol)
+        
+        if not pending:
+            return analyses
+        
+        gathered = await asyncio.gather(*(self._gather_comprehensive_data(symbol, True, extract_news=False) for symbol in pending))
+        symbol_data = dict(zip(pending, gathered))
+        
+        # Tag the shared RSS news with every pending symbol in one pass
+        rss_data = next((data['rss_market_data'] for data in gathered if 'rss_market_data' in data), None)
+        if rss_data:
+            news_index = self._index_news_by_symbol(pending, rss_data)
+            for symbol, data in symbol_data.items():
+                data['symbol_news'] = news_index[symbol]
+        
+        symbol_blocks = "\n".join(
+            f"\n===== {symbol} ====={self._format_data_context(data)}" for symbol, data in symbol_data.items()
+        )
+        prompt = f"""
+Bạn là chuyên gia phân tích đầu tư hàng đầu với 20 năm kinh nghiệm và access vào dữ liệu real-time.
+
+🎯 PHÂN TÍCH ĐỒNG THỜI {len(pending)} CỔ PHIẾU: {', '.join(pending)}
+{symbol_blocks}
+
+📋 YÊU CẦU: Với MỖI cổ phiếu, đánh giá khuyến nghị, độ tin cậy, giá mục tiêu 3-6 tháng, mức rủi ro và thời gian đầu tư.
+
+CHỈ trả về MỘT object JSON hợp lệ (không markdown, không giải thích), dạng:
+{{"SYMBOL": {{"recommendation": "BUY|SELL|HOLD", "confidence_score": 0-100, "target_price": số, "risk_level": "LOW|MEDIUM|HIGH", "time_horizon": "SHORT|MEDIUM|LONG", "summary": "tối đa 60 từ"}}}}
+"""
+        
+        ai_response = await self._make_enhanced_ai_request(prompt)
+        batch_results = self._parse_batch_analysis(ai_response)
+        
+        missing = []
+        for symbol, data in symbol_data.items():
+            result = batch_results.get(symbol) or batch_results.get(symbol.upper())
+            if not isinstance(result, dict):
+                missing.append(symbol)
+                continue
+            
+            # Malformed fields (e.g. "85%" or null) only send this symbol to the fallback
+            try:
+                parsed_data = {
+                    'recommendation': str(result.get('recommendation', 'HOLD')).upper(),
+                    'confidence_score': float(result.get('confidence_score', 70)),
+                    'risk_level': str(result.get('risk_level', 'MEDIUM')).upper(),
+                    'time_horizon': str(result.get('time_horizon', 'MEDIUM')).upper()
+                }
+                if isinstance(result.get('target_price'), (int, float)):
+                    parsed_data['target_price'] = float(result['target_price'])
+            except (ValueError, TypeError) as e:
+                logger.warning(f"⚠️ Batch analysis for {symbol} malformed: {e}")
+                missing.append(symbol)
+                continue
+            
+            analysis = self._build_enhanced_analysis(symbol, parsed_data, str(result.get('summary', '')), data)
+            self._cache_analysis(f"{symbol}_{analysis_depth}_True", analysis)
+            analyses[symbol] = analysis
+        
+        # Anything the batch response didn't cover falls back to a per-symbol request
+        if missing:
+            logger.warning(f"⚠️ Batch analysis missing {missing}, analyzing individually")
+            fallbacks = await asyncio.gather(*(
+                self.analyze_stock_comprehensive_enhanced(symbol, include_rss_data=True, analysis_depth=analysis_depth)
+                for symbol in missing
+            ))
+            analyses.update(zip(missing, fallbacks))
+        
+        return {symbol: analyses[symbol] for symbol in symbols}
+
+    def _parse_batch_analysis(self, ai_response: str) -> Dict[str, Any]:
+        """Parse the JSON object returned for a batch analysis request"""
+        try:
+            json_text = re.sub(r'```(?:json)?\s*|\s*```', '', ai_response.strip())
+            start, end = json_text.find('{'), json_text.rfind('}')
+            if start == -1 or end == -1:
+                return {}
+            parsed = json.loads(json_text[start:end + 1])
+            return parsed if isinstance(parsed, dict) else {}
+        except (ValueError, TypeError) as e:
+            logger.error(f"❌ Batch analysis parsing failed: {e}")
+            return {}
+
     async def generate_smart_portfolio_recommendation(self, 
                                                     symbols: List[str],
                                                     risk_profile: str = 'moderate',
@@ -592,11 +1068,8 @@ Hãy tạo phân tích chuyên nghiệp và actionable cho nhà đầu tư:
         try:
             logger.info(f"🎯 Generating smart portfolio for {len(symbols)} symbols")
             
-            # Analyze each symbol
-            symbol_analyses = {}
-            for symbol in symbols[:10]:  # Limit to 10 symbols
-                analysis = await self.analyze_stock_comprehensive_enhanced(symbol, include_rss_data=True, analysis_depth="standard")
-                symbol_analyses[symbol] = analysis
+            # Analyze all symbols with one batched AI request
+            symbol_analyses = await self._analyze_symbols_batch(symbols[:10], analysis_depth="standard")  # Limit to 10 symbols
             
             # Generate AI-powered portfolio allocation
             portfolio_prompt = f"""
@@ -647,19 +1120,9 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
         allocation = {symbol: equal_weight for symbol in symbols}
         
         # Calculate sector allocation
-        sector_allocation = {}
+        sector_allocation = defaultdict(float)
         for symbol in symbols:
-            # Simplified sector mapping
-            if symbol in ['VIC', 'VHM', 'VRE']:
-                sector = 'Real Estate'
-            elif symbol in ['VCB', 'BID', 'CTG', 'TCB']:
-                sector = 'Banking'
-            elif symbol in ['AAPL', 'GOOGL', 'MSFT', 'NVDA']:
-                sector = 'Technology'
-            else:
-                sector = 'Other'
-            
-            sector_allocation[sector] = sector_allocation.get(sector, 0) + equal_weight
+            sector_allocation[_SECTOR_MAP.get(symbol, 'Other')] += equal_weight
         
         # Risk-adjusted metrics
         risk_multiplier = {'conservative': 0.8, 'moderate': 1.0, 'aggressive': 1.3}.get(risk_profile, 1.0)
@@ -672,14 +1135,8 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
             sharpe_ratio=round(0.6 * risk_multiplier, 2),
             max_drawdown=round(15.0 / risk_multiplier, 1),
             diversification_score=80.0,
-            sector_allocation=sector_allocation,
-            recommendations=[
-                "Đa dạng hóa theo ngành nghề",
-                "Rebalance portfolio định kỳ",
-                "Theo dõi market conditions",
-                "Quản lý rủi ro chặt chẽ",
-                "Đầu tư dài hạn"
-            ],
+            sector_allocation=dict(sector_allocation),
+            recommendations=_DEFAULT_RECOMMENDATIONS,
             rebalancing_frequency="Quarterly"
         )
 
@@ -697,7 +1154,7 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
             max_drawdown=18.0,
             diversification_score=70.0,
             sector_allocation={"Mixed": 100.0},
-            recommendations=["Phân tích kỹ hơn khi dữ liệu đầy đủ"],
+            recommendations=_FALLBACK_RECOMMENDATIONS,
             rebalancing_frequency="Semi-annual"
         )
 
@@ -708,18 +1165,22 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
             
             sentiment_data = {'overall_sentiment': 'NEUTRAL', 'sentiment_score': 50}
             
-            # Get RSS market data if available
+            # Stream RSS news and score each batch as it arrives, overlapping the slower fetches
             if self.financial_rss_service:
-                market_data = await self.financial_rss_service.get_real_time_market_summary()
-                if market_data.get('success'):
-                    # Analyze market sentiment from RSS
-                    sentiment_data = await self._analyze_rss_market_sentiment(market_data)
+                tally = _SentimentTally()
+                market_news = []
+                async for batch in self.financial_rss_service.stream_market_news(batch_size=20):
+                    tally.add_news(batch)
+                    market_news.extend(batch)
+                # Segment analyses need every categorized item, so they are folded in once the stream ends
+                tally.add_analyses(self.financial_rss_service.analyze_market_news(market_news))
+                sentiment_data = tally.result(self.MIN_SENTIMENT_NEWS)
             
             return MarketSentimentAnalysis(
                 overall_sentiment=sentiment_data.get('overall_sentiment', 'NEUTRAL'),
                 sentiment_score=sentiment_data.get('sentiment_score', 50),
                 confidence=sentiment_data.get('confidence', 70),
-                key_drivers=sentiment_data.get('key_drivers', ['Market analysis in progress']),
+                key_drivers=tuple(sentiment_data.get('key_drivers', ('Market analysis in progress',))),
                 news_volume=sentiment_data.get('news_volume', 0),
                 social_sentiment=sentiment_data.get('social_sentiment', 50),
                 institutional_sentiment=sentiment_data.get('institutional_sentiment', 50),
@@ -735,47 +1196,10 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
         """Analyze market sentiment from RSS data"""
         try:
             financial_data = market_data.get('financial_data', {})
-            market_news = financial_data.get('market_news', [])
-            market_analysis = financial_data.get('analysis', [])
-            
-            # Calculate overall sentiment
-            sentiment_scores = []
-            key_drivers = []
-            
-            for news in market_news[:20]:
-                extracted = news.get('extracted_data', {})
-                if 'sentiment_score' in extracted:
-                    sentiment_scores.append(extracted['sentiment_score'])
-                    
-                title = news.get('title', '')
-                if len(title) > 10:
-                    key_drivers.append(title[:80])
-            
-            # Aggregate analysis sentiments
-            for analysis in market_analysis:
-                sentiment_score = analysis.get('sentiment_score', 50)
-                sentiment_scores.append(sentiment_score)
-            
-            avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 50
-            
-            if avg_sentiment >= 70:
-                overall_sentiment = 'BULLISH'
-            elif avg_sentiment <= 30:
-                overall_sentiment = 'BEARISH'
-            else:
-                overall_sentiment = 'NEUTRAL'
-            
-            return {
-                'overall_sentiment': overall_sentiment,
-                'sentiment_score': round(avg_sentiment, 1),
-                'confidence': min(95, 50 + len(sentiment_scores) * 2),
-                'key_drivers': key_drivers[:5],
-                'news_volume': len(market_news),
-                'social_sentiment': round(avg_sentiment + random.uniform(-10, 10), 1),
-                'institutional_sentiment': round(avg_sentiment + random.uniform(-5, 5), 1),
-                'retail_sentiment': round(avg_sentiment + random.uniform(-15, 15), 1),
-                'outlook': f"Market shows {overall_sentiment.lower()} sentiment based on {len(sentiment_scores)} data points"
-            }
+            tally = _SentimentTally()
+            tally.add_news(financial_data.get('market_news', []))
+            tally.add_analyses(financial_data.get('analysis', []))
+            return tally.result(self.MIN_SENTIMENT_NEWS)
             
         except Exception as e:
             logger.error(f"❌ RSS sentiment analysis failed: {e}")
@@ -787,7 +1211,7 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
             overall_sentiment='NEUTRAL',
             sentiment_score=50.0,
             confidence=50.0,
-            key_drivers=["Dữ liệu không đầy đủ"],
+            key_drivers=_FALLBACK_KEY_DRIVERS,
             news_volume=0,
             social_sentiment=50.0,
             institutional_sentiment=50.0,
@@ -798,15 +1222,15 @@ Tạo portfolio cân bằng risk-return cho nhà đầu tư {risk_profile}:
     def get_analysis_stats(self) -> Dict[str, Any]:
         """Get analysis performance statistics"""
         total_analyses = len(self.analysis_cache)
+        lookups = self._cache_hits + self._cache_misses
         
-        cache_ages = []
-        for cache_time in self.cache_ttl.values():
-            age_seconds = (datetime.now() - cache_time).total_seconds()
-            cache_ages.append(age_seconds)
+        cache_times = np.fromiter(
+            (cache_time for cache_time, _ in self.analysis_cache.values()), dtype=np.float64, count=total_analyses
+        )
         
         return {
             'total_analyses_cached': total_analyses,
-            'cache_hit_rate': f"{(total_analyses/max(1, total_analyses))*100:.1f}%",
-            'average_cache_age': f"{statistics.mean(cache_ages):.1f}s" if cache_ages else "0s",
-            'api_calls_saved': total_analyses
+            'cache_hit_rate': f"{self._cache_hits / max(1, lookups) * 100:.1f}%",
+            'average_cache_age': f"{time.monotonic() - cache_times.mean():.1f}s" if total_analyses else "0s",
+            'api_calls_saved': self._cache_hits
         } 
\ No newline at end of file
@@ -6,19 +6,133 @@ Sử dụng Groq làm primary provider, Gemini làm fallback
 
 import asyncio
 import aiohttp
+import hashlib
 import json
 import logging
-from typing import List, Dict, Optional
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from datetime import datetime
-import google.generativeai as genai
 from config import Config
 from models.article import Article
 
 logger = logging.getLogger(__name__)
 
+# orjson encodes request bodies and decodes every SSE chunk natively; stdlib json is the fallback
+try:
+    import orjson
+    
+    _dumps_body = orjson.dumps
+    _loads_json = orjson.loads
+except ImportError:
+    def _dumps_body(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    
+    _loads_json = json.loads
+
+# Prompt templates, parsed once at import and filled with str.format per article
+_SUMMARY_TEMPLATE = """
+        Tóm tắt bài báo sau đây bằng tiếng Việt, nêu bật tính liên quan và sức hấp dẫn:
+        
+        Tiêu đề: {title}
+        Nội dung: {content}...
+        Nguồn: {source}
+        
+        Tập trung vào:
+        - Các điểm chính và ý nghĩa
+        - Tại sao câu chuyện này quan trọng
+        - Các khía cạnh gây tranh cãi hoặc thú vị
+        - Tác động đến Việt Nam (nếu có)
+        
+        Viết ngắn gọn (100-150 từ), phong cách chuyên gia nhưng dễ hiểu.
+        """
+
+_FACEBOOK_POST_TEMPLATE = """
+        Tạo một bài viết Facebook bằng tiếng Việt (250-400 từ) dựa trên bài báo này:
+        
+        Tiêu đề: {title}
+        Nội dung: {content}
+        URL: {url}
+        Nguồn: {source}
+        {expert_context}
+        
+        Phong cách: {style_instruction}
+        
+        Yêu cầu:
+        - Thêm yếu tố hấp dẫn và dễ chia sẻ
+        - Thêm hashtag phù hợp
+        - Tham khảo nguồn tin
+        - Phân tích tác động (nếu có)
+        - Sử dụng emoji phù hợp
+        - Tránh markdown phức tạp
+        
+        Viết tự nhiên, không sử dụng ký tự đặc biệt gây lỗi.
+        """
+
+_IMAGE_PROMPT_TEMPLATE = """
+        Tạo prompt tạo ảnh AI chi tiết cho bài báo này:
+        
+        Tiêu đề: {title}
+        Nội dung chính: {content}
+        Context: {context}
+        
+        Yêu cầu prompt:
+        - Mô tả hình ảnh cụ thể, rõ ràng
+        - Phù hợp với nội dung bài báo
+        - Phong cách chuyên nghiệp, tin tức
+        - Thêm logo PioneerX góc dưới phải
+        - Màu sắc phù hợp với chủ đề
+        - Không chứa text trong ảnh
+        
+        Chỉ trả về prompt tiếng Anh, không giải thích thêm.
+        """
+
+class _TokenBucket:
+    """Async token bucket: refills `rate` tokens per second up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a token is available, then take it"""
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            
+            self.tokens -= 1
+
 class EnhancedAIService:
     """Enhanced AI Service with Groq primary, Gemini fallback"""
     
+    # Facebook post style instructions
+    STYLE_PROMPTS = {
+        "expert": "Viết với giọng điệu chuyên gia có uy tín, phân tích chuyên sâu",
+        "friendly": "Viết thân thiện, gần gũi như nói chuyện với bạn bè",
+        "news": "Viết theo phong cách báo chí, khách quan và chính xác",
+        "debate": "Viết theo phong cách tranh luận, nêu nhiều quan điểm",
+        "educational": "Viết theo phong cách giáo dục, giải thích dễ hiểu",
+        "inspirational": "Viết theo phong cách truyền cảm hứng, tích cực"
+    }
+    
+    SUMMARY_BATCH_SIZE = 10
+    SUMMARY_TOKENS_PER_ARTICLE = 400  # room for one 100-150 word Vietnamese summary
+    GROQ_KEY_MAX_COOLDOWN = 60  # seconds
+    MAX_CONCURRENT_GROQ_REQUESTS = 8
+    GROQ_REQUESTS_PER_MINUTE = 30  # per key
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 3600  # seconds
+    
     def __init__(self):
         self.config = Config()
         
@@ -30,6 +144,10 @@ class EnhancedAIService:
         ]
         self.current_groq_key_index = 0
         
+        # Per-key health: keys that recently failed cool down and are skipped up front
+        self._groq_key_health = [{'cooldown_until': 0.0, 'fails': 0} for _ in self.groq_api_keys]
+        self._next_groq_key = 0
+        
         # Gemini fallback configuration
         self.gemini_api_keys = self.config.get_active_api_keys('gemini')
         self.current_gemini_key_index = 0
@@ -43,22 +161,39 @@ class EnhancedAIService:
             "gemma2-9b-it"  # Good alternative
         ]
         
-        # Initialize Gemini fallback
-        self._setup_gemini_fallback()
+        # Gemini fallback is configured on first use, so healthy Groq runs never import the SDK
+        self.gemini_model = None
+        self._gemini_ready = False
+        
+        # Shared keep-alive HTTP session for Groq, created on first use
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # Admission control: bound in-flight Groq calls and pace each key under its quota
+        self._groq_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_GROQ_REQUESTS)
+        self._groq_buckets = [
+            _TokenBucket(rate=self.GROQ_REQUESTS_PER_MINUTE / 60, capacity=self.GROQ_REQUESTS_PER_MINUTE)
+            for _ in self.groq_api_keys
+        ]
+        
+        # Generated content keyed by prompt hash: LRU of digest -> (cached_at, content)
+        self._response_cache: OrderedDict[str, Tuple[float, str]] = OrderedDict()
         
         # Usage stats
         self.usage_stats = {
             'groq_requests': 0,
             'groq_success': 0,
+            'groq_first_token_ms': None,
             'gemini_requests': 0,
             'gemini_success': 0,
             'total_requests': 0
         }
         
     def _setup_gemini_fallback(self):
-        """Setup Gemini as fallback"""
+        """Setup Gemini as fallback (imports the SDK lazily)"""
+        self._gemini_ready = True
         if self.gemini_api_keys:
             try:
+                import google.generativeai as genai
                 genai.configure(api_key=self.gemini_api_keys[self.current_gemini_key_index])
                 self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
                 logger.info("✅ Gemini fallback configured successfully")
@@ -69,13 +204,46 @@ class EnhancedAIService:
             self.gemini_model = None
             logger.warning("⚠️ No Gemini API keys found for fallback")
     
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+    
     async def _make_groq_request(self, prompt: str, model: str = None, max_tokens: int = 1000, temperature: float = 0.7) -> Dict:
         """Make request to Groq API"""
         if not model:
             model = self.groq_models[0]  # Default to best model
-            
+        
+        try:
+            content = ''.join([delta async for delta in self._stream_groq_request(prompt, model, max_tokens, temperature)])
+            logger.info(f"✅ Groq request successful with {model}")
+            return {
+                'success': True,
+                'content': content,
+                'provider': 'groq',
+                'model': model
+            }
+        except asyncio.TimeoutError:
+            logger.error("⏱️ Groq API timeout")
+            return {'success': False, 'error': 'Groq API timeout', 'provider': 'groq'}
+        except Exception as e:
+            logger.error(f"❌ Groq request failed: {e}")
+            return {'success': False, 'error': str(e), 'provider': 'groq'}
+    
+    async def _stream_groq_request(self, prompt: str, model: str, max_tokens: int = 1000, temperature: float = 0.7) -> AsyncIterator[str]:
+        """Stream a Groq chat completion as text deltas (server-sent events)"""
+        key_index = self._pick_groq_key()
         headers = {
-            "Authorization": f"Bearer {self.groq_api_keys[self.current_groq_key_index]}",
+            "Authorization": f"Bearer {self.groq_api_keys[key_index]}",
             "Content-Type": "application/json"
         }
         
@@ -85,67 +253,88 @@ class EnhancedAIService:
                 {"role": "user", "content": prompt}
             ],
             "max_tokens": max_tokens,
-            "temperature": temperature
+            "temperature": temperature,
+            "stream": True
         }
         
         self.usage_stats['groq_requests'] += 1
         self.usage_stats['total_requests'] += 1
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
+        # Wait for the key's quota first so paced requests don't hold a concurrency slot
+        await self._groq_buckets[key_index].acquire()
+        async with self._groq_semaphore:
+            started = time.monotonic()
+            session = self._get_session()
+            async with session.post(
+                "https://api.groq.com/openai/v1/chat/completions",
+                headers=headers,
+                data=_dumps_body(data)
+            ) as response:
+                
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"❌ Groq API error {response.status}: {error_text}")
                     
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result['choices'][0]['message']['content']
-                        self.usage_stats['groq_success'] += 1
-                        logger.info(f"✅ Groq request successful with {model}")
-                        return {
-                            'success': True,
-                            'content': content,
-                            'provider': 'groq',
-                            'model': model
-                        }
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Groq API error {response.status}: {error_text}")
-                        
-                        # Try to rotate key if quota exceeded
-                        if response.status == 429:
-                            self._rotate_groq_key()
-                            
-                        return {
-                            'success': False,
-                            'error': f"Groq API error {response.status}",
-                            'provider': 'groq'
-                        }
-                        
-        except asyncio.TimeoutError:
-            logger.error("⏱️ Groq API timeout")
-            return {'success': False, 'error': 'Groq API timeout', 'provider': 'groq'}
-        except Exception as e:
-            logger.error(f"❌ Groq request failed: {e}")
-            return {'success': False, 'error': str(e), 'provider': 'groq'}
+                    # Quota or server trouble on this key: cool it down so later requests skip it
+                    if response.status == 429 or response.status >= 500:
+                        self._mark_groq_key_failed(key_index)
+                    
+                    raise RuntimeError(f"Groq API error {response.status}")
+                
+                first_token = True
+                async for line in response.content:
+                    if not line.startswith(b'data: '):
+                        continue
+                    payload = line[6:].strip()
+                    if payload == b'[DONE]':
+                        break
+                    
+                    delta = _loads_json(payload)['choices'][0]['delta'].get('content')
+                    if delta:
+                        if first_token:
+                            first_token = False
+                            self.usage_stats['groq_first_token_ms'] = round((time.monotonic() - started) * 1000)
+                            logger.info(f"⚡ Groq first token from {model} in {self.usage_stats['groq_first_token_ms']}ms")
+                        yield delta
+                
+                self.usage_stats['groq_success'] += 1
+                self._groq_key_health[key_index]['fails'] = 0
+    
+    def _pick_groq_key(self) -> int:
+        """Round-robin over keys not cooling down; the soonest-recovering key if all are"""
+        now = time.monotonic()
+        key_count = len(self.groq_api_keys)
+        
+        for offset in range(key_count):
+            index = (self._next_groq_key + offset) % key_count
+            if self._groq_key_health[index]['cooldown_until'] <= now:
+                break
+        else:
+            index = min(range(key_count), key=lambda i: self._groq_key_health[i]['cooldown_until'])
+        
+        self._next_groq_key = (index + 1) % key_count
+        self.current_groq_key_index = index
+        return index
     
-    def _rotate_groq_key(self):
-        """Rotate to next Groq API key"""
-        self.current_groq_key_index = (self.current_groq_key_index + 1) % len(self.groq_api_keys)
-        logger.info(f"🔄 Rotated to Groq key #{self.current_groq_key_index + 1}")
+    def _mark_groq_key_failed(self, index: int):
+        """Put a key on exponential cooldown after a quota/server error"""
+        health = self._groq_key_health[index]
+        health['fails'] += 1
+        cooldown = min(self.GROQ_KEY_MAX_COOLDOWN, 2 ** health['fails'])
+        health['cooldown_until'] = time.monotonic() + cooldown
+        logger.info(f"🔄 Groq key #{index + 1} cooling down for {cooldown}s")
     
     async def _make_gemini_request(self, prompt: str) -> Dict:
         """Make request to Gemini API as fallback"""
+        if not self._gemini_ready:
+            self._setup_gemini_fallback()
         if not self.gemini_model:
             return {'success': False, 'error': 'Gemini not configured', 'provider': 'gemini'}
         
         self.usage_stats['gemini_requests'] += 1
         
         try:
-            response = await asyncio.to_thread(self.gemini_model.generate_content, prompt)
+            response = await self.gemini_model.generate_content_async(prompt)
             content = response.text
             self.usage_stats['gemini_success'] += 1
             logger.info("✅ Gemini fallback request successful")
@@ -159,7 +348,26 @@ class EnhancedAIService:
             logger.error(f"❌ Gemini fallback failed: {e}")
             return {'success': False, 'error': str(e), 'provider': 'gemini'}
     
-    async def generate_content(self, prompt: str, prefer_fast: bool = False) -> str:
+    async def _race_groq_models(self, prompt: str, models: List[str], max_tokens: int = 1000) -> Optional[str]:
+        """Query several Groq models concurrently, returning the first successful content"""
+        if not models:
+            return None
+        
+        logger.info(f"🔄 Trying backup Groq models: {', '.join(models)}")
+        tasks = [asyncio.create_task(self._make_groq_request(prompt, m, max_tokens)) for m in models]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                if result['success']:
+                    return result['content']
+            return None
+        finally:
+            # Drop the slower attempts once one has won (no-op for finished tasks)
+            for task in tasks:
+                task.cancel()
+    
+    async def generate_content(self, prompt: str, prefer_fast: bool = False, use_cache: bool = False,
+                               cache_ttl: float = RESPONSE_CACHE_TTL, max_tokens: int = 1000) -> str:
         """Generate content with Groq primary, Gemini fallback"""
         
         # Choose model based on task
@@ -168,20 +376,65 @@ class EnhancedAIService:
         else:
             model = "llama-3.3-70b-versatile"  # Best model for complex tasks
         
+        # Only deterministic tasks (summaries, image prompts) opt in to reusing an identical
+        # request within the TTL, so regenerating a post always asks the model again
+        if use_cache:
+            cache_key = hashlib.blake2b(f"{model}|{max_tokens}|{prompt}".encode('utf-8'), digest_size=16).hexdigest()
+            cached = self._response_cache.get(cache_key)
+            if cached is not None and time.monotonic() - cached[0] < cache_ttl:
+                self._response_cache.move_to_end(cache_key)
+                return cached[1]
+        
+        content = await self._generate_uncached(prompt, model, max_tokens)
+        if content is not None:
+            if use_cache:
+                self._response_cache[cache_key] = (time.monotonic(), content)
+                self._response_cache.move_to_end(cache_key)
+                if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+            return content
+        
+        # All failed
+        logger.error("❌ All AI providers failed")
+        return "❌ Xin lỗi, không thể tạo nội dung lúc này. Vui lòng thử lại sau."
+    
+    async def generate_content_stream(self, prompt: str, prefer_fast: bool = False) -> AsyncIterator[str]:
+        """Stream content as it is generated; falls back to the full provider cascade if Groq fails before any text"""
+        model = "llama-3.1-8b-instant" if prefer_fast else "llama-3.3-70b-versatile"
+        
+        logger.info(f"🚀 Streaming Groq with model: {model}")
+        streamed = False
+        try:
+            async for delta in self._stream_groq_request(prompt, model):
+                streamed = True
+                yield delta
+            return
+        except Exception as e:
+            # Text already sent can't be retracted, so only a failure before the first delta falls back
+            if streamed:
+                raise
+            logger.error(f"❌ Groq stream failed: {e}")
+        
+        content = await self._generate_fallback(prompt, model)
+        yield content if content is not None else "❌ Xin lỗi, không thể tạo nội dung lúc này. Vui lòng thử lại sau."
+    
+    async def _generate_uncached(self, prompt: str, model: str, max_tokens: int = 1000) -> Optional[str]:
+        """Try Groq (primary, then racing backups) and Gemini; None when every provider fails"""
         # Try Groq first
         logger.info(f"🚀 Trying Groq with model: {model}")
-        result = await self._make_groq_request(prompt, model)
+        result = await self._make_groq_request(prompt, model, max_tokens)
         
         if result['success']:
             return result['content']
         
-        # Try different Groq model if first failed
-        for backup_model in self.groq_models[1:]:
-            if backup_model != model:
-                logger.info(f"🔄 Trying backup Groq model: {backup_model}")
-                result = await self._make_groq_request(prompt, backup_model)
-                if result['success']:
-                    return result['content']
+        return await self._generate_fallback(prompt, model, max_tokens)
+    
+    async def _generate_fallback(self, prompt: str, model: str, max_tokens: int = 1000) -> Optional[str]:
+        """Backup Groq models raced, then Gemini; None when every provider fails"""
+        # Race the backup Groq models and take the first success
+        content = await self._race_groq_models(prompt, [m for m in self.groq_models[1:] if m != model], max_tokens)
+        if content is not None:
+            return content
         
         # Fallback to Gemini
         logger.info("⚠️ Groq failed, falling back to Gemini")
@@ -190,9 +443,7 @@ class EnhancedAIService:
         if result['success']:
             return result['content']
         
-        # All failed
-        logger.error("❌ All AI providers failed")
-        return "❌ Xin lỗi, không thể tạo nội dung lúc này. Vui lòng thử lại sau."
+        return None
     
     async def generate_custom_content(self, prompt: str) -> str:
         """Generate custom content (alias for compatibility)"""
@@ -200,92 +451,116 @@ class EnhancedAIService:
     
     async def generate_article_summary(self, article: Article) -> str:
         """Generate Vietnamese summary for article"""
-        prompt = f"""
-        Tóm tắt bài báo sau đây bằng tiếng Việt, nêu bật tính liên quan và sức hấp dẫn:
+        prompt = _SUMMARY_TEMPLATE.format(title=article.title, content=article.content_preview(1500), source=article.source)
         
-        Tiêu đề: {article.title}
-        Nội dung: {article.content[:1500]}...
-        Nguồn: {article.source}
+        return await self.generate_content(prompt, prefer_fast=True, use_cache=True)
+    
+    async def summarize_articles(self, articles: List[Article]) -> List[Dict]:
+        """Generate summaries for articles with relevance and appeal scores"""
+        summaries = await self.generate_article_summaries_batch(articles)
+        return [
+            {
+                'rank': i,
+                'article': article,
+                'summary': summary,
+                'relevance_score': article.total_score
+            }
+            for i, (article, summary) in enumerate(zip(articles, summaries), 1)
+        ]
+    
+    async def generate_article_summaries_batch(self, articles: List[Article]) -> List[str]:
+        """Summarize articles with one request per SUMMARY_BATCH_SIZE articles"""
+        batches = [articles[i:i + self.SUMMARY_BATCH_SIZE] for i in range(0, len(articles), self.SUMMARY_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._summarize_batch(batch) for batch in batches))
+        return [summary for batch_summaries in results for summary in batch_summaries]
+    
+    async def _summarize_batch(self, articles: List[Article]) -> List[str]:
+        """Summarize a batch of articles in one prompt returning a JSON array"""
+        if len(articles) == 1:
+            return [await self.generate_article_summary(articles[0])]
+        
+        article_blocks = "\n".join(
+            f"""
+        [{i}] Tiêu đề: {article.title}
+        Nội dung: {article.content_preview(1500)}...
+        Nguồn: {article.source}"""
+            for i, article in enumerate(articles, 1)
+        )
+        prompt = f"""
+        Tóm tắt TỪNG bài báo sau đây bằng tiếng Việt, nêu bật tính liên quan và sức hấp dẫn:
+        {article_blocks}
         
-        Tập trung vào:
+        Mỗi tóm tắt tập trung vào:
         - Các điểm chính và ý nghĩa
         - Tại sao câu chuyện này quan trọng
         - Các khía cạnh gây tranh cãi hoặc thú vị
         - Tác động đến Việt Nam (nếu có)
         
-        Viết ngắn gọn (100-150 từ), phong cách chuyên gia nhưng dễ hiểu.
+        Mỗi tóm tắt viết ngắn gọn (100-150 từ), phong cách chuyên gia nhưng dễ hiểu.
+        CHỈ trả về một mảng JSON gồm đúng {len(articles)} chuỗi theo thứ tự bài báo, không giải thích thêm.
         """
         
-        return await self.generate_content(prompt, prefer_fast=True)
+        # The whole array has to fit in one completion, or the truncated reply parses as nothing
+        response = await self.generate_content(prompt, prefer_fast=True, use_cache=True,
+                                               max_tokens=self.SUMMARY_TOKENS_PER_ARTICLE * len(articles))
+        summaries = self._parse_summary_array(response, len(articles))
+        
+        # Articles the batch reply didn't cover are summarized individually
+        missing = [i for i, summary in enumerate(summaries) if not summary]
+        if missing:
+            logger.warning(f"⚠️ Batch summary incomplete, summarizing {len(missing)} article(s) individually")
+            retried = await asyncio.gather(*(self.generate_article_summary(articles[i]) for i in missing))
+            for i, summary in zip(missing, retried):
+                summaries[i] = summary
+        return summaries
+    
+    @staticmethod
+    def _parse_summary_array(response: str, expected: int) -> List[Optional[str]]:
+        """Parse a JSON array of summaries; missing or malformed entries come back as None"""
+        summaries: List[Optional[str]] = [None] * expected
+        try:
+            text = re.sub(r'```(?:json)?\s*|\s*```', '', response.strip())
+            start, end = text.find('['), text.rfind(']')
+            if start == -1 or end == -1:
+                return summaries
+            parsed = _loads_json(text[start:end + 1])
+            for i, summary in enumerate(parsed[:expected] if isinstance(parsed, list) else []):
+                if isinstance(summary, str) and summary.strip():
+                    summaries[i] = summary.strip()
+        except ValueError as e:
+            logger.error(f"❌ Batch summary parsing failed: {e}")
+        return summaries
     
     async def generate_facebook_post(self, article: Article, style: str = "expert", expert_posts: List[Dict] = None) -> str:
         """Generate Facebook post with specified style"""
         
-        # Style templates
-        style_prompts = {
-            "expert": "Viết với giọng điệu chuyên gia có uy tín, phân tích chuyên sâu",
-            "friendly": "Viết thân thiện, gần gũi như nói chuyện với bạn bè",
-            "news": "Viết theo phong cách báo chí, khách quan và chính xác",
-            "debate": "Viết theo phong cách tranh luận, nêu nhiều quan điểm",
-            "educational": "Viết theo phong cách giáo dục, giải thích dễ hiểu",
-            "inspirational": "Viết theo phong cách truyền cảm hứng, tích cực"
-        }
-        
-        style_instruction = style_prompts.get(style, style_prompts["expert"])
+        style_instruction = self.STYLE_PROMPTS.get(style, self.STYLE_PROMPTS["expert"])
         
         expert_context = ""
         if expert_posts:
             expert_context = f"""
             
             Các bài viết liên quan từ chuyên gia:
-            {chr(10).join([post.get('content', '')[:200] + '...' for post in expert_posts[:3]])}
+            {chr(10).join(post.get('content', '')[:200] + '...' for post in expert_posts[:3])}
             """
         
-        prompt = f"""
-        Tạo một bài viết Facebook bằng tiếng Việt (250-400 từ) dựa trên bài báo này:
-        
-        Tiêu đề: {article.title}
-        Nội dung: {article.content[:2000]}
-        URL: {article.url}
-        Nguồn: {article.source}
-        {expert_context}
-        
-        Phong cách: {style_instruction}
-        
-        Yêu cầu:
-        - Thêm yếu tố hấp dẫn và dễ chia sẻ
-        - Thêm hashtag phù hợp
-        - Tham khảo nguồn tin
-        - Phân tích tác động (nếu có)
-        - Sử dụng emoji phù hợp
-        - Tránh markdown phức tạp
-        
-        Viết tự nhiên, không sử dụng ký tự đặc biệt gây lỗi.
-        """
+        prompt = _FACEBOOK_POST_TEMPLATE.format(
+            title=article.title,
+            content=article.content_preview(2000),
+            url=article.url,
+            source=article.source,
+            expert_context=expert_context,
+            style_instruction=style_instruction
+        )
         
         return await self.generate_content(prompt)
     
     async def generate_image_prompt(self, article: Article, context: str = "") -> str:
         """Generate image prompt based on article content"""
-        prompt = f"""
-        Tạo prompt tạo ảnh AI chi tiết cho bài báo này:
-        
-        Tiêu đề: {article.title}
-        Nội dung chính: {article.content[:1000]}
-        Context: {context}
-        
-        Yêu cầu prompt:
-        - Mô tả hình ảnh cụ thể, rõ ràng
-        - Phù hợp với nội dung bài báo
-        - Phong cách chuyên nghiệp, tin tức
-        - Thêm logo PioneerX góc dưới phải
-        - Màu sắc phù hợp với chủ đề
-        - Không chứa text trong ảnh
-        
-        Chỉ trả về prompt tiếng Anh, không giải thích thêm.
-        """
+        prompt = _IMAGE_PROMPT_TEMPLATE.format(title=article.title, content=article.content_preview(1000), context=context)
         
-        return await self.generate_content(prompt, prefer_fast=True)
+        # Image prompts depend only on the article, so they stay valid for a day
+        return await self.generate_content(prompt, prefer_fast=True, use_cache=True, cache_ttl=86400)
     
     def get_usage_stats(self) -> Dict:
         """Get current usage statistics"""
@@ -294,8 +569,9 @@ class EnhancedAIService:
             'groq_success_rate': f"{(self.usage_stats['groq_success'] / max(self.usage_stats['groq_requests'], 1) * 100):.1f}%",
             'gemini_success_rate': f"{(self.usage_stats['gemini_success'] / max(self.usage_stats['gemini_requests'], 1) * 100):.1f}%",
             'current_groq_key': self.current_groq_key_index + 1,
+            'healthy_groq_keys': sum(1 for health in self._groq_key_health if health['cooldown_until'] <= time.monotonic()),
             'available_groq_keys': len(self.groq_api_keys),
-            'gemini_fallback_available': self.gemini_model is not None
+            'gemini_fallback_available': self.gemini_model is not None if self._gemini_ready else bool(self.gemini_api_keys)
         }
     
     def get_api_status(self) -> dict:
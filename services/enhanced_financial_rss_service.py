@@ -6,23 +6,197 @@ Dịch vụ RSS tài chính nâng cao với khả năng phân tích AI chuyên s
 
 import asyncio
 import aiohttp
-import feedparser
 import ssl
 import re
 import json
 import logging
-from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass
 import xml.etree.ElementTree as ET
 from urllib.parse import urljoin, urlparse
-import hashlib
+from email.utils import mktime_tz, parsedate_tz
+from lxml import etree, html as lxml_html
 import time
-import statistics
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# HTTP session settings, built once per process (loading the CA bundle is not free)
+_SSL_CONTEXT = ssl.create_default_context()
+_SESSION_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=10)
+_SESSION_HEADERS = {
+    'User-Agent': 'Enhanced Financial RSS Bot/2.0 (Financial Analysis)',
+    'Accept': 'application/rss+xml, application/xml, text/xml, */*',
+    'Accept-Language': 'vi-VN,vi;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Cache-Control': 'no-cache'
+}
+
+# Feed formats keyed by root tag: (entry tag, feed title tag, {entry child tag: entry field}).
+# Exact tags let each format's parse skip namespace handling per element.
+_ATOM = '{http://www.w3.org/2005/Atom}'
+_RSS1 = '{http://purl.org/rss/1.0/}'
+_DC_DATE = '{http://purl.org/dc/elements/1.1/}date'
+_FEED_FORMATS = {
+    'rss': ('item', 'title', {
+        'title': 'title', 'link': 'link', 'description': 'description',
+        'pubDate': 'published', _DC_DATE: 'published'
+    }),
+    f'{_ATOM}feed': (f'{_ATOM}entry', f'{_ATOM}title', {
+        f'{_ATOM}title': 'title', f'{_ATOM}link': 'link', f'{_ATOM}summary': 'summary',
+        f'{_ATOM}published': 'published', f'{_ATOM}updated': 'published'
+    }),
+    '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF': (f'{_RSS1}item', f'{_RSS1}title', {
+        f'{_RSS1}title': 'title', f'{_RSS1}link': 'link', f'{_RSS1}description': 'description',
+        _DC_DATE: 'published'
+    })
+}
+
+# Source types whose symbol mentions count as Vietnamese stocks
+_VN_SOURCE_TYPES = frozenset({'vn_economy', 'vn_stock', 'vn_finance'})
+
+# Cache-miss sentinel for caches that store None as a real value
+_MISSING = object()
+
+# MarketAnalysis fields taken from a segment analysis dict, with their defaults
+# (key_factors is handled separately so each result gets its own list)
+_ANALYSIS_DEFAULTS = {
+    'trend': 'NEUTRAL',
+    'momentum': 'WEAK',
+    'recommendation': 'HOLD',
+    'confidence_score': 50.0,
+    'analysis_text': '',
+    'risk_level': 'MEDIUM'
+}
+
+# Title terms routing symbol-less entries to the gold and USD/VND buckets
+_GOLD_TERMS = ('gold', 'vàng')
+_USD_TERMS = ('usd', 'dollar', 'tỷ giá')
+
+# Headline keywords counted (once each) towards an entry's sentiment
+_BULLISH_KEYWORDS = ('tăng', 'lên', 'tích cực', 'khả quan', 'rally', 'bull', 'gain', 'rise')
+_BEARISH_KEYWORDS = ('giảm', 'xuống', 'tiêu cực', 'lo ngại', 'sell-off', 'bear', 'fall', 'decline')
+
+def _term_pattern(terms) -> re.Pattern:
+    """One pattern finding every occurrence of any term, overlapping ones included, in a single scan"""
+    alternation = '|'.join(map(re.escape, sorted(terms, key=len, reverse=True)))
+    return re.compile(f'(?=({alternation}))')
+
+_KEYWORD_PATTERN = _term_pattern(_BULLISH_KEYWORDS + _BEARISH_KEYWORDS)
+_BULLISH_KEYWORD_SET = frozenset(_BULLISH_KEYWORDS)
+
+def _extract_text(text: str, symbol_pattern: re.Pattern, symbols_lower: Dict[str, str], price_patterns: Tuple[Tuple[str, re.Pattern], ...]) -> Dict[str, Any]:
+    """Regex extraction over one entry's title and description"""
+    extracted = {}
+    text = text.lower()
+    
+    try:
+        # Extract stock symbols
+        found = set(symbol_pattern.findall(text))
+        if found:
+            extracted['symbols'] = [symbol for symbol_lower, symbol in symbols_lower.items() if symbol_lower in found]
+        
+        # One pass per kind, so text such as "USD 24,500 VND" still counts as both a VND and a USD price
+        for kind, price_pattern in price_patterns:
+            for match in price_pattern.finditer(text):
+                raw = match.group(match.lastgroup)
+                try:
+                    if kind == 'vnd':
+                        value = float(raw.replace(',', '').replace('.', ''))
+                        key, valid = 'prices_vnd', 1000 <= value <= 10000000  # Reasonable stock price range
+                    elif kind == 'usd':
+                        value = float(raw.replace(',', ''))
+                        key, valid = 'prices_usd', 1 <= value <= 100000  # Reasonable USD price range
+                    else:
+                        value = float(raw.replace(',', '.'))
+                        key, valid = 'change_percent', -50 <= value <= 50  # Reasonable daily change range
+                except ValueError:
+                    continue
+                if valid:
+                    extracted.setdefault(key, []).append(value)
+        
+        # Detect market sentiment keywords
+        keywords = set(_KEYWORD_PATTERN.findall(text))
+        bullish_count = len(keywords & _BULLISH_KEYWORD_SET)
+        bearish_count = len(keywords) - bullish_count
+        
+        if bullish_count > bearish_count and bullish_count > 0:
+            extracted['sentiment'] = 'bullish'
+            extracted['sentiment_score'] = min(bullish_count * 20, 100)
+        elif bearish_count > bullish_count and bearish_count > 0:
+            extracted['sentiment'] = 'bearish' 
+            extracted['sentiment_score'] = min(bearish_count * 20, 100)
+        else:
+            extracted['sentiment'] = 'neutral'
+            extracted['sentiment_score'] = 50
+        
+    except Exception as e:
+        logger.error(f"❌ Price extraction error: {e}")
+    
+    return extracted
+
+def _classify_entry(title: str, source_type: str, extracted_data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """The (group, bucket) of financial_data an entry belongs in, or None for news only"""
+    if not extracted_data:
+        return None
+    if extracted_data.get('symbols'):
+        return ('stocks', 'vn') if source_type in _VN_SOURCE_TYPES else ('stocks', 'global')
+    title_lower = title.lower()
+    if any(term in title_lower for term in _GOLD_TERMS):
+        return 'commodities', 'gold'
+    if any(term in title_lower for term in _USD_TERMS):
+        return 'currencies', 'usd_vnd'
+    return None
+
+@lru_cache(maxsize=4096)
+def _parse_pub_date(raw: str) -> Optional[datetime]:
+    """RFC 822 (RSS, named zones like EST/GMT included) or ISO 8601 (Atom) date as naive UTC"""
+    parsed = parsedate_tz(raw)
+    if parsed:
+        return datetime(*time.gmtime(mktime_tz(parsed))[:6])
+    try:
+        moment = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+def _entry_timestamp(entry: Dict[str, Any], now: datetime) -> datetime:
+    """Publication time of an entry from its raw date string, or `now` when missing/unparseable"""
+    raw = entry.get('published')
+    return (raw and _parse_pub_date(raw)) or now
+
+# Longest description kept; snippets past this carry no further prices or symbols
+_MAX_DESCRIPTION_CHARS = 2048
+_TEXT_FIELDS = ('description', 'summary')
+
+def _html_to_text(markup: str) -> str:
+    """Plain text of an HTML snippet (lxml, C-backed), truncated for the extraction regexes"""
+    if '<' in markup:
+        try:
+            markup = lxml_html.fragment_fromstring(markup, create_parent='div').text_content()
+        except (etree.ParserError, ValueError):
+            pass
+    return markup[:_MAX_DESCRIPTION_CHARS]
+
+def _entry_from_element(element: Any, fields: Dict[str, str]) -> Dict[str, Any]:
+    """The title/link/description/published fields of a parsed item, feedparser-style.
+    Dates stay raw strings; they are parsed (memoized) when the entry is extracted."""
+    entry = {}
+    for child in element:
+        field = fields.get(child.tag)
+        if field == 'link':
+            # Atom puts the URL in href; keep the first non-empty link
+            entry['link'] = entry.get('link') or (child.text or '').strip() or child.get('href', '')
+        elif field in _TEXT_FIELDS:
+            entry.setdefault(field, _html_to_text((child.text or '').strip()))
+        elif field:
+            entry.setdefault(field, (child.text or '').strip())
+    return entry
+
+@dataclass(slots=True)
 class FinancialData:
     symbol: str
     name: str
@@ -35,7 +209,7 @@ class FinancialData:
     last_updated: Optional[datetime] = None
     source: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class CommodityData:
     name: str
     price: float
@@ -46,7 +220,7 @@ class CommodityData:
     last_updated: datetime = None
     source: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class MarketAnalysis:
     symbol: str
     trend: str  # BULLISH, BEARISH, NEUTRAL
@@ -74,10 +248,24 @@ class EnhancedFinancialRSSService:
     - 🎯 Sentiment analysis từ tin tức tài chính
     """
     
+    MAX_FEED_ENTRIES = 20
+    MAX_CONCURRENT_FETCHES = 12
+    EXTRACTION_CACHE_SIZE = 4096
+    STATS_CACHE_SECONDS = 1.0
+    SYMBOL_CACHE_SIZE = 256
+    DEFAULT_SOURCE_TYPES = ('vn_economy', 'vn_stock', 'global_markets', 'commodities', 'forex')
+    
     def __init__(self):
         self.session = None
+        self._fetch_semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_FETCHES)
+        # In-flight fetch per source, shared by every caller that finds the cache expired
+        self._inflight_fetches: Dict[str, asyncio.Task] = {}
+        # Last get_cache_stats() result as (computed_at monotonic, stats)
+        self._stats_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # LRU of (symbol, minute bucket) -> MarketAnalysis, None when the symbol had no analysis
+        self._symbol_cache: OrderedDict[Tuple[str, int], Optional[MarketAnalysis]] = OrderedDict()
         self.cache = {}
-        self.cache_ttl = {}
+        self.cache_ttl: Dict[str, float] = {}  # source_key -> time.monotonic() when cached
         self.default_ttl = timedelta(minutes=5)  # Faster refresh for financial data
         
         # RSS Sources for Financial Data
@@ -175,6 +363,10 @@ class EnhancedFinancialRSSService:
             }
         }
         
+        # Cache times as one contiguous array (NaN = never cached) for vectorized stats
+        self._source_index = {source_key: i for i, source_key in enumerate(self.financial_rss_sources)}
+        self._cache_times = np.full(len(self.financial_rss_sources), np.nan)
+        
         # Market symbols mapping
         self.symbols_mapping = {
             # Vietnamese stocks
@@ -218,30 +410,36 @@ class EnhancedFinancialRSSService:
                 r'giảm\s*(\d{1,2}(?:[,\.]\d{1,2})?)\s*%'
             ]
         }
+        
+        # Each kind's patterns fused into one alternation, compiled once; every pattern's capture
+        # group is renamed to g<n> so a match reports which alternative found the value
+        self._price_patterns = tuple(
+            (kind, re.compile('|'.join(
+                re.sub(r'\((?!\?)', f'(?P<g{i}>', pattern, count=1) for i, pattern in enumerate(patterns)
+            ), re.IGNORECASE))
+            for kind, patterns in self.price_patterns.items()
+        )
+        self._symbols_lower = {symbol.lower(): symbol for symbol in self.symbols_mapping}
+        self._symbol_pattern = _term_pattern(self._symbols_lower)
+        
+        # Syndicated headlines and re-polled feeds repeat the same text; extraction is pure.
+        # LRU of "title\ndescription" -> extracted data
+        self._extraction_cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
 
     async def get_session(self) -> aiohttp.ClientSession:
         """Get or create HTTP session with optimized settings"""
         if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=15, connect=10)
             connector = aiohttp.TCPConnector(
                 limit=100,
                 limit_per_host=30,
-                ssl=ssl.create_default_context(),
+                ssl=_SSL_CONTEXT,
                 enable_cleanup_closed=True
             )
             
-            headers = {
-                'User-Agent': 'Enhanced Financial RSS Bot/2.0 (Financial Analysis)',
-                'Accept': 'application/rss+xml, application/xml, text/xml, */*',
-                'Accept-Language': 'vi-VN,vi;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate',
-                'Cache-Control': 'no-cache'
-            }
-            
             self.session = aiohttp.ClientSession(
-                timeout=timeout,
+                timeout=_SESSION_TIMEOUT,
                 connector=connector,
-                headers=headers
+                headers=_SESSION_HEADERS
             )
             
         return self.session
@@ -251,15 +449,31 @@ class EnhancedFinancialRSSService:
         if self.session and not self.session.closed:
             await self.session.close()
 
-    def _is_cache_valid(self, source_key: str) -> bool:
-        """Check if cached data is still valid"""
-        if source_key not in self.cache:
+    async def close(self):
+        """Close the HTTP session"""
+        # Fast path: nothing to await when no session was opened or it is already closed
+        if self.session is not None and not self.session.closed:
+            await self.close_session()
+
+    def _is_cache_valid(self, source_key: str, now: Optional[float] = None) -> bool:
+        """Check if cached data is still valid; bulk callers pass one monotonic `now` for every source"""
+        cache_time = self.cache_ttl.get(source_key)
+        if source_key not in self.cache or cache_time is None:
             return False
         
-        cache_time = self.cache_ttl.get(source_key, datetime.now() - timedelta(hours=1))
         source_ttl = self.financial_rss_sources.get(source_key, {}).get('ttl', 300)
         
-        return (datetime.now() - cache_time).total_seconds() < source_ttl
+        return (now or time.monotonic()) - cache_time < source_ttl
+
+    def _fetch_source(self, source_key: str, url: str) -> asyncio.Future:
+        """Fetch a feed, joining an in-flight fetch of the same source rather than starting another"""
+        task = self._inflight_fetches.get(source_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_rss_with_retry(url, source_key))
+            self._inflight_fetches[source_key] = task
+            task.add_done_callback(lambda _: self._inflight_fetches.pop(source_key, None))
+        # Shielded so one cancelled caller does not cancel the fetch for the others
+        return asyncio.shield(task)
 
     async def _fetch_rss_with_retry(self, url: str, source_key: str, max_retries: int = 3) -> Optional[Dict]:
         """Fetch RSS with smart retry mechanism"""
@@ -269,35 +483,38 @@ class EnhancedFinancialRSSService:
             try:
                 await asyncio.sleep(attempt * 0.5)  # Progressive delay
                 
-                async with session.get(url) as response:
+                # Bounded fan-out: bursting every feed at once trips the sources' rate limits
+                rate_limited = False
+                async with self._fetch_semaphore, session.get(url) as response:
                     if response.status == 200:
-                        content = await response.text()
-                        
-                        # Parse RSS feed
-                        feed = feedparser.parse(content)
+                        # Pull-parse the feed while it downloads
+                        feed_title, entries = await self._parse_feed_stream(response)
                         
-                        if feed.entries:
+                        if entries:
                             parsed_data = {
                                 'source': source_key,
-                                'title': feed.feed.get('title', source_key),
-                                'entries': feed.entries[:20],  # Limit entries
+                                'title': feed_title or source_key,
+                                'entries': entries,
                                 'updated': datetime.now(),
-                                'total_entries': len(feed.entries)
+                                'total_entries': len(entries)
                             }
                             
                             # Cache the result
                             self.cache[source_key] = parsed_data
-                            self.cache_ttl[source_key] = datetime.now()
+                            self.cache_ttl[source_key] = self._cache_times[self._source_index[source_key]] = time.monotonic()
                             
-                            logger.info(f"✅ RSS fetched from {source_key}: {len(feed.entries)} entries")
+                            logger.info(f"✅ RSS fetched from {source_key}: {len(entries)} entries")
                             return parsed_data
                     
                     elif response.status == 429:  # Rate limited
-                        await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                        continue
+                        rate_limited = True
                         
                     else:
                         logger.warning(f"⚠️ RSS fetch failed for {source_key}: status {response.status}")
+                
+                # Back off only after the fetch slot and the connection are released
+                if rate_limited:
+                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
                         
             except asyncio.TimeoutError:
                 logger.warning(f"⏰ Timeout fetching {source_key}, attempt {attempt + 1}/{max_retries}")
@@ -306,11 +523,73 @@ class EnhancedFinancialRSSService:
                 
         return None
 
+    async def _parse_feed_stream(self, response: aiohttp.ClientResponse) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Incrementally parse an RSS 2.0/Atom/RSS 1.0 body, stopping after MAX_FEED_ENTRIES entries"""
+        parser = etree.XMLPullParser(events=('start', 'end'))
+        received = []
+        feed_format = None
+        feed_title = None
+        entries = []
+        entry_depth = 0
+        
+        try:
+            async for chunk in response.content.iter_chunked(8192):
+                received.append(chunk)
+                parser.feed(chunk)
+                for event, element in parser.read_events():
+                    if feed_format is None:
+                        # The root element's start names the format
+                        feed_format = _FEED_FORMATS.get(element.tag)
+                        if feed_format is None:
+                            logger.debug(f"Unrecognised feed root {element.tag!r}, falling back to feedparser")
+                            return await self._parse_with_feedparser(response, received)
+                        entry_tag, title_tag, fields = feed_format
+                        continue
+                    
+                    if element.tag == entry_tag:
+                        if event == 'start':
+                            entry_depth += 1
+                            continue
+                        entry_depth -= 1
+                        entries.append(_entry_from_element(element, fields))
+                        
+                        # Drop the finished item and its already-read siblings to keep memory flat
+                        element.clear()
+                        while element.getprevious() is not None:
+                            del element.getparent()[0]
+                        
+                        if len(entries) >= self.MAX_FEED_ENTRIES:
+                            return feed_title, entries
+                    elif event == 'end' and element.tag == title_tag and not entry_depth and feed_title is None:
+                        feed_title = (element.text or '').strip()
+            parser.close()
+        except etree.XMLSyntaxError as e:
+            # Malformed XML (HTML entities, stray markup): let feedparser's lenient parser try
+            logger.debug(f"Streaming RSS parse failed, falling back to feedparser: {e}")
+            return await self._parse_with_feedparser(response, received)
+        
+        return feed_title, entries
+
+    async def _parse_with_feedparser(self, response: aiohttp.ClientResponse, received: List[bytes]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Lenient fallback: read the rest of the body and let feedparser handle it"""
+        import feedparser
+        received.append(await response.content.read())
+        feed = feedparser.parse(b''.join(received))
+        entries = feed.entries[:self.MAX_FEED_ENTRIES]
+        for entry in entries:
+            for field in _TEXT_FIELDS:
+                if field in entry:
+                    entry[field] = _html_to_text(entry[field])
+        return feed.feed.get('title'), entries
+
     async def fetch_financial_feeds(self, source_types: List[str] = None) -> Dict[str, Any]:
         """Fetch financial data from multiple RSS sources"""
         try:
+            # Read the clocks once for the whole cycle: cache checks, default timestamps, last_updated
+            now = datetime.now()
+            checked_at = time.monotonic()
             if source_types is None:
-                source_types = ['vn_economy', 'vn_stock', 'global_markets', 'commodities', 'forex']
+                source_types = list(self.DEFAULT_SOURCE_TYPES)
             
             # Filter sources by type
             selected_sources = {
@@ -323,7 +602,7 @@ class EnhancedFinancialRSSService:
             sources_to_fetch = {}
             
             for source_key, source_config in selected_sources.items():
-                if self._is_cache_valid(source_key):
+                if self._is_cache_valid(source_key, checked_at):
                     cached_results[source_key] = self.cache[source_key]
                     logger.info(f"🎯 Using cached data for {source_key}")
                 else:
@@ -332,7 +611,7 @@ class EnhancedFinancialRSSService:
             # Fetch new data in parallel
             if sources_to_fetch:
                 tasks = [
-                    self._fetch_rss_with_retry(config['url'], source_key)
+                    self._fetch_source(source_key, config['url'])
                     for source_key, config in sources_to_fetch.items()
                 ]
                 
@@ -343,7 +622,7 @@ class EnhancedFinancialRSSService:
                         cached_results[source_key] = result
             
             # Extract financial data
-            financial_data = await self._extract_financial_data(cached_results)
+            financial_data = await self._extract_financial_data(cached_results, now)
             
             return {
                 'success': True,
@@ -351,7 +630,7 @@ class EnhancedFinancialRSSService:
                 'total_sources': len(selected_sources),
                 'cache_hits': len(selected_sources) - len(sources_to_fetch),
                 'financial_data': financial_data,
-                'last_updated': datetime.now(),
+                'last_updated': now,
                 'metadata': {
                     'source_types': source_types,
                     'data_freshness': 'real-time',
@@ -367,8 +646,64 @@ class EnhancedFinancialRSSService:
                 'financial_data': {}
             }
 
-    async def _extract_financial_data(self, rss_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def stream_market_news(self, source_types: List[str] = None, batch_size: int = 20) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield market news in batches as each feed arrives instead of waiting for every source"""
+        if source_types is None:
+            source_types = self.DEFAULT_SOURCE_TYPES
+        
+        now = datetime.now()
+        checked_at = time.monotonic()
+        batch = []
+        pending = []
+        for source_key, source_config in self.financial_rss_sources.items():
+            if source_config['type'] not in source_types:
+                continue
+            if self._is_cache_valid(source_key, checked_at):
+                batch.extend(await self._extract_market_news(source_key, self.cache[source_key], now))
+            else:
+                pending.append(self._fetch_source(source_key, source_config['url']))
+        
+        for next_feed in asyncio.as_completed(pending):
+            try:
+                feed_data = await next_feed
+            except Exception as e:
+                logger.error(f"❌ Feed stream error: {e}")
+                continue
+            if feed_data:
+                batch.extend(await self._extract_market_news(feed_data['source'], feed_data, now))
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        
+        if batch:
+            yield batch
+
+    async def _extract_market_news(self, source_key: str, feed_data: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+        """Market news items of a single feed, shaped like _extract_financial_data's market_news"""
+        source_type = self.financial_rss_sources.get(source_key, {}).get('type', 'unknown')
+        news_items = []
+        
+        for entry in feed_data.get('entries', [])[:10]:
+            try:
+                title = entry.get('title', '')
+                description = entry.get('description', '') or entry.get('summary', '')
+                news_items.append({
+                    'title': title,
+                    'description': description[:300],
+                    'source': source_key,
+                    'type': source_type,
+                    'url': entry.get('link', ''),
+                    'timestamp': _entry_timestamp(entry, now),
+                    'extracted_data': self._extract_prices_and_symbols(title, description)
+                })
+            except Exception as e:
+                logger.error(f"❌ Error processing entry from {source_key}: {e}")
+        
+        return news_items
+
+    async def _extract_financial_data(self, rss_data: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
         """Extract structured financial data from RSS feeds"""
+        now = now or datetime.now()
         financial_data = {
             'stocks': {'vn': [], 'global': []},
             'commodities': {'gold': [], 'oil': [], 'other': []},
@@ -388,48 +723,22 @@ class EnhancedFinancialRSSService:
                     title = entry.get('title', '')
                     description = entry.get('description', '') or entry.get('summary', '')
                     link = entry.get('link', '')
-                    pub_date = entry.get('published_parsed')
+                    timestamp = _entry_timestamp(entry, now)
                     
                     # Extract financial data using NLP patterns
-                    extracted_data = await self._extract_prices_and_symbols(title, description)
+                    extracted_data = self._extract_prices_and_symbols(title, description)
                     
-                    if extracted_data:
-                        # Categorize based on content
-                        if any(symbol in extracted_data for symbol in self.symbols_mapping.keys()):
-                            if source_type in ['vn_economy', 'vn_stock', 'vn_finance']:
-                                financial_data['stocks']['vn'].append({
-                                    'title': title,
-                                    'data': extracted_data,
-                                    'source': source_key,
-                                    'url': link,
-                                    'timestamp': datetime(*pub_date[:6]) if pub_date else datetime.now()
-                                })
-                            else:
-                                financial_data['stocks']['global'].append({
-                                    'title': title,
-                                    'data': extracted_data,
-                                    'source': source_key,
-                                    'url': link,
-                                    'timestamp': datetime(*pub_date[:6]) if pub_date else datetime.now()
-                                })
-                        
-                        elif 'gold' in title.lower() or 'vàng' in title.lower():
-                            financial_data['commodities']['gold'].append({
-                                'title': title,
-                                'data': extracted_data,
-                                'source': source_key,
-                                'url': link,
-                                'timestamp': datetime(*pub_date[:6]) if pub_date else datetime.now()
-                            })
-                        
-                        elif any(term in title.lower() for term in ['usd', 'dollar', 'tỷ giá']):
-                            financial_data['currencies']['usd_vnd'].append({
-                                'title': title,
-                                'data': extracted_data,
-                                'source': source_key,
-                                'url': link,
-                                'timestamp': datetime(*pub_date[:6]) if pub_date else datetime.now()
-                            })
+                    # Categorize based on content: one routing decision, one dict per entry
+                    category = _classify_entry(title, source_type, extracted_data)
+                    if category:
+                        group, bucket = category
+                        financial_data[group][bucket].append({
+                            'title': title,
+                            'data': extracted_data,
+                            'source': source_key,
+                            'url': link,
+                            'timestamp': timestamp
+                        })
                     
                     # Always add to market news for sentiment analysis
                     financial_data['market_news'].append({
@@ -438,7 +747,7 @@ class EnhancedFinancialRSSService:
                         'source': source_key,
                         'type': source_type,
                         'url': link,
-                        'timestamp': datetime(*pub_date[:6]) if pub_date else datetime.now(),
+                        'timestamp': timestamp,
                         'extracted_data': extracted_data
                     })
                     
@@ -447,90 +756,45 @@ class EnhancedFinancialRSSService:
                     continue
         
         # Generate AI analysis
-        financial_data['analysis'] = await self._generate_market_analysis(financial_data)
+        financial_data['analysis'] = self._generate_market_analysis(financial_data)
         
         return financial_data
 
-    async def _extract_prices_and_symbols(self, title: str, description: str) -> Dict[str, Any]:
-        """Extract prices, symbols, and financial data using regex patterns"""
-        extracted = {}
-        text = f"{title} {description}".lower()
-        
-        try:
-            # Extract stock symbols
-            for symbol in self.symbols_mapping.keys():
-                if symbol.lower() in text:
-                    extracted['symbols'] = extracted.get('symbols', [])
-                    extracted['symbols'].append(symbol)
-            
-            # Extract prices (VND)
-            for pattern in self.price_patterns['vnd']:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    prices = []
-                    for match in matches:
-                        try:
-                            price = float(match.replace(',', '').replace('.', ''))
-                            if 1000 <= price <= 10000000:  # Reasonable stock price range
-                                prices.append(price)
-                        except:
-                            continue
-                    if prices:
-                        extracted['prices_vnd'] = prices
-            
-            # Extract USD prices
-            for pattern in self.price_patterns['usd']:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    prices = []
-                    for match in matches:
-                        try:
-                            price = float(match.replace(',', ''))
-                            if 1 <= price <= 100000:  # Reasonable USD price range
-                                prices.append(price)
-                        except:
-                            continue
-                    if prices:
-                        extracted['prices_usd'] = prices
-            
-            # Extract percentages
-            for pattern in self.price_patterns['percent']:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                if matches:
-                    percentages = []
-                    for match in matches:
-                        try:
-                            pct = float(match.replace(',', '.'))
-                            if -50 <= pct <= 50:  # Reasonable daily change range
-                                percentages.append(pct)
-                        except:
-                            continue
-                    if percentages:
-                        extracted['change_percent'] = percentages
-            
-            # Detect market sentiment keywords
-            bullish_keywords = ['tăng', 'lên', 'tích cực', 'khả quan', 'rally', 'bull', 'gain', 'rise']
-            bearish_keywords = ['giảm', 'xuống', 'tiêu cực', 'lo ngại', 'sell-off', 'bear', 'fall', 'decline']
-            
-            bullish_count = sum(1 for word in bullish_keywords if word in text)
-            bearish_count = sum(1 for word in bearish_keywords if word in text)
-            
-            if bullish_count > bearish_count and bullish_count > 0:
-                extracted['sentiment'] = 'bullish'
-                extracted['sentiment_score'] = min(bullish_count * 20, 100)
-            elif bearish_count > bullish_count and bearish_count > 0:
-                extracted['sentiment'] = 'bearish' 
-                extracted['sentiment_score'] = min(bearish_count * 20, 100)
-            else:
-                extracted['sentiment'] = 'neutral'
-                extracted['sentiment_score'] = 50
-            
-        except Exception as e:
-            logger.error(f"❌ Price extraction error: {e}")
-        
-        return extracted
+    def _extract_prices_and_symbols(self, title: str, description: str) -> Dict[str, Any]:
+        """Extract prices, symbols, and financial data using regex patterns (memoized per text)"""
+        text = f"{title}\n{description}"
+        extracted = self._extraction_cache.get(text)
+        if extracted is None:
+            extracted = _extract_text(text, self._symbol_pattern, self._symbols_lower, self._price_patterns)
+            self._extraction_cache[text] = extracted
+            if len(self._extraction_cache) > self.EXTRACTION_CACHE_SIZE:
+                self._extraction_cache.popitem(last=False)
+        else:
+            self._extraction_cache.move_to_end(text)
+        # Fresh lists too, so a caller mutating symbols/prices can't corrupt the cached entry
+        return {key: value.copy() if isinstance(value, list) else value for key, value in extracted.items()}
 
-    async def _generate_market_analysis(self, financial_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def analyze_market_news(self, market_news: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Segment analyses for streamed market news, as _extract_financial_data builds its 'analysis'"""
+        financial_data = {
+            'stocks': {'vn': [], 'global': []},
+            'commodities': {'gold': [], 'oil': [], 'other': []},
+            'currencies': {'usd_vnd': [], 'major_pairs': []}
+        }
+        for news in market_news:
+            category = _classify_entry(news['title'], news['type'], news['extracted_data'])
+            if category:
+                group, bucket = category
+                financial_data[group][bucket].append({
+                    'title': news['title'],
+                    'data': news['extracted_data'],
+                    'source': news['source'],
+                    'url': news['url'],
+                    'timestamp': news['timestamp']
+                })
+        return self._generate_market_analysis(financial_data)
+
+    def _generate_market_analysis(self, financial_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generate AI-powered market analysis"""
         analysis_results = []
         
@@ -538,25 +802,25 @@ class EnhancedFinancialRSSService:
             # Analyze Vietnamese stocks
             vn_stocks = financial_data.get('stocks', {}).get('vn', [])
             if vn_stocks:
-                vn_analysis = await self._analyze_market_segment('VN-Index', vn_stocks, 'Vietnamese Market')
+                vn_analysis = self._analyze_market_segment('VN-Index', vn_stocks, 'Vietnamese Market')
                 analysis_results.append(vn_analysis)
             
             # Analyze global stocks
             global_stocks = financial_data.get('stocks', {}).get('global', [])
             if global_stocks:
-                global_analysis = await self._analyze_market_segment('Global', global_stocks, 'Global Markets')
+                global_analysis = self._analyze_market_segment('Global', global_stocks, 'Global Markets')
                 analysis_results.append(global_analysis)
             
             # Analyze gold market
             gold_data = financial_data.get('commodities', {}).get('gold', [])
             if gold_data:
-                gold_analysis = await self._analyze_commodity('GOLD', gold_data, 'Gold Market')
+                gold_analysis = self._analyze_market_segment('GOLD', gold_data, 'Gold Market')
                 analysis_results.append(gold_analysis)
             
             # Analyze USD/VND
             usd_data = financial_data.get('currencies', {}).get('usd_vnd', [])
             if usd_data:
-                usd_analysis = await self._analyze_currency('USD/VND', usd_data, 'USD Exchange Rate')
+                usd_analysis = self._analyze_market_segment('USD/VND', usd_data, 'USD Exchange Rate')
                 analysis_results.append(usd_analysis)
             
         except Exception as e:
@@ -564,7 +828,7 @@ class EnhancedFinancialRSSService:
         
         return analysis_results
 
-    async def _analyze_market_segment(self, symbol: str, data_points: List[Dict], market_name: str) -> Dict[str, Any]:
+    def _analyze_market_segment(self, symbol: str, data_points: List[Dict], market_name: str) -> Dict[str, Any]:
         """Analyze a specific market segment with AI insights"""
         
         # Calculate sentiment score
@@ -576,7 +840,11 @@ class EnhancedFinancialRSSService:
             if 'sentiment_score' in extracted:
                 sentiment_scores.append(extracted['sentiment_score'])
         
-        avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 50
+        # Mean and sample variance from one pair of running sums
+        score_count = len(sentiment_scores)
+        score_sum = sum(sentiment_scores)
+        score_sq_sum = sum(score * score for score in sentiment_scores)
+        avg_sentiment = score_sum / score_count if score_count else 50
         
         # Determine trend
         if avg_sentiment >= 70:
@@ -608,7 +876,9 @@ class EnhancedFinancialRSSService:
                 key_factors.append(title[:100] + '...' if len(title) > 100 else title)
         
         # Calculate confidence based on data volume and sentiment consistency
-        sentiment_variance = statistics.variance(sentiment_scores) if len(sentiment_scores) > 1 else 0
+        sentiment_variance = (
+            max(0.0, (score_sq_sum - score_sum * avg_sentiment) / (score_count - 1)) if score_count > 1 else 0
+        )
         confidence = max(20, min(95, 60 + (total_articles * 5) - (sentiment_variance / 2)))
         
         return {
@@ -627,14 +897,6 @@ class EnhancedFinancialRSSService:
             'last_updated': datetime.now()
         }
 
-    async def _analyze_commodity(self, symbol: str, data_points: List[Dict], commodity_name: str) -> Dict[str, Any]:
-        """Analyze commodity (gold, oil, etc.) with specialized logic"""
-        return await self._analyze_market_segment(symbol, data_points, commodity_name)
-
-    async def _analyze_currency(self, pair: str, data_points: List[Dict], currency_name: str) -> Dict[str, Any]:
-        """Analyze currency pair with forex-specific insights"""
-        return await self._analyze_market_segment(pair, data_points, currency_name)
-
     async def get_real_time_market_summary(self) -> Dict[str, Any]:
         """Get comprehensive real-time market summary"""
         try:
@@ -688,7 +950,15 @@ class EnhancedFinancialRSSService:
             }
 
     async def get_symbol_analysis(self, symbol: str) -> Optional[MarketAnalysis]:
-        """Get detailed AI analysis for specific symbol"""
+        """Get detailed AI analysis for specific symbol (memoized within the minute)"""
+        # The minute bucket in the key expires entries without any sweeping
+        # No lock: the event loop runs this check-and-read without yielding
+        cache_key = (symbol, int(time.monotonic() // 60))
+        cached = self._symbol_cache.get(cache_key, _MISSING)
+        if cached is not _MISSING:
+            self._symbol_cache.move_to_end(cache_key)
+            return cached
+        
         try:
             # Fetch relevant data for the symbol
             market_data = await self.get_real_time_market_summary()
@@ -697,43 +967,51 @@ class EnhancedFinancialRSSService:
                 return None
             
             # Find symbol in analysis results
+            result = None
             for analysis in market_data.get('market_analysis', []):
                 if analysis.get('symbol') == symbol or symbol in analysis.get('market_name', ''):
-                    return MarketAnalysis(
+                    fields = {**_ANALYSIS_DEFAULTS, **analysis}
+                    result = MarketAnalysis(
                         symbol=symbol,
-                        trend=analysis.get('trend', 'NEUTRAL'),
-                        momentum=analysis.get('momentum', 'WEAK'),
-                        recommendation=analysis.get('recommendation', 'HOLD'),
-                        confidence_score=analysis.get('confidence_score', 50.0),
-                        analysis_text=analysis.get('analysis_text', ''),
-                        key_factors=analysis.get('key_factors', []),
-                        risk_level=analysis.get('risk_level', 'MEDIUM')
+                        key_factors=analysis.get('key_factors') or [],
+                        **{name: fields[name] for name in _ANALYSIS_DEFAULTS}
                     )
+                    break
             
-            return None
+            self._symbol_cache[cache_key] = result
+            if len(self._symbol_cache) > self.SYMBOL_CACHE_SIZE:
+                self._symbol_cache.popitem(last=False)
+            return result
             
         except Exception as e:
             logger.error(f"❌ Symbol analysis failed for {symbol}: {e}")
             return None
 
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get cache performance statistics"""
+        """Get cache performance statistics (monitoring-grade, reused for STATS_CACHE_SECONDS)"""
+        if self._stats_cache is not None and time.monotonic() - self._stats_cache[0] < self.STATS_CACHE_SECONDS:
+            return dict(self._stats_cache[1])
+        
         total_sources = len(self.financial_rss_sources)
         cached_sources = len(self.cache)
         
-        cache_ages = []
-        for source_key, cache_time in self.cache_ttl.items():
-            age_seconds = (datetime.now() - cache_time).total_seconds()
-            cache_ages.append(age_seconds)
+        # Ages of every cached source as one vector; mean/max/min are C reductions
+        ages = time.monotonic() - self._cache_times[~np.isnan(self._cache_times)]
+        if ages.size:
+            average_age, oldest_age, newest_age = (f"{age:.1f}s" for age in (ages.mean(), ages.max(), ages.min()))
+        else:
+            average_age = oldest_age = newest_age = "0s"
         
-        return {
+        stats = {
             'total_sources': total_sources,
             'cached_sources': cached_sources,
             'cache_hit_rate': f"{(cached_sources/total_sources*100):.1f}%" if total_sources > 0 else "0%",
-            'average_cache_age': f"{statistics.mean(cache_ages):.1f}s" if cache_ages else "0s",
-            'oldest_cache': f"{max(cache_ages):.1f}s" if cache_ages else "0s",
-            'newest_cache': f"{min(cache_ages):.1f}s" if cache_ages else "0s"
+            'average_cache_age': average_age,
+            'oldest_cache': oldest_age,
+            'newest_cache': newest_age
         }
+        self._stats_cache = (time.monotonic(), stats)
+        return dict(stats)
 
     async def __aenter__(self):
         """Async context manager entry"""
@@ -741,4 +1019,4 @@ class EnhancedFinancialRSSService:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        await self.close_session() 
\ No newline at end of file
+        await self.close() 
\ No newline at end of file
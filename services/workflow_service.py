@@ -27,7 +27,7 @@ from .detailed_workflow_logger import DetailedWorkflowLogger
 logger = logging.getLogger(__name__)
 
 class WorkflowService:
-    def __init__(self, news_service, ai_service, image_service, facebook_service, logging_service):
+    def __init__(self, news_service, ai_service, image_service, facebook_service, logging_service, detailed_logger=None):
         self.news_service = news_service
         self.ai_service = ai_service
         self.image_service = image_service
@@ -41,8 +41,9 @@ class WorkflowService:
         # Initialize Workflow CSV Logger
         self.csv_logger = WorkflowCSVLogger()
         
-        # Initialize Detailed Workflow Logger (comprehensive tracking)
-        self.detailed_logger = DetailedWorkflowLogger()
+        # Detailed Workflow Logger (comprehensive tracking); share the bot's instance when given,
+        # since each logger owns a writer thread and an append descriptor on the same log
+        self.detailed_logger = detailed_logger or DetailedWorkflowLogger()
         
     async def start_workflow(self, user_id: int, context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         """Start the complete News-Facebook AI Agent Workflow"""